@@ -1,16 +1,37 @@
 from __future__ import absolute_import
 
 from ._access import (
+    AccessDecisionCache,
+    AccessRule,
+    AllOf,
     AnonymousRequiredMixin,
+    AnyOf,
+    Authenticated,
     GroupRequiredMixin,
+    HasPerm,
+    InGroup,
     LoginRequiredMixin,
     MultiplePermissionsRequiredMixin,
+    Not,
+    ObjectPermissionsListMixin,
+    PassesTest,
     PermissionRequiredMixin,
+    PermissionsContextMixin,
+    PermissionsMap,
+    PolicyRequiredMixin,
+    PreloadUserAccessMixin,
+    Staff,
+    Superuser,
     StaffuserRequiredMixin,
     SuperuserRequiredMixin,
     UserPassesTestMixin,
     SSLRequiredMixin,
-    RecentLoginRequiredMixin
+    RecentLoginRequiredMixin,
+    get_access_cache
+)
+from ._audit import (
+    AccessAuditLog,
+    ModelAuditSink
 )
 from ._ajax import (
     AjaxResponseMixin,
@@ -18,6 +39,11 @@ from ._ajax import (
     JSONResponseMixin,
     JsonRequestResponseMixin
 )
+from ._json import (
+    JSONEngine,
+    OrjsonJSONEngine,
+    StdlibJSONEngine
+)
 from ._forms import (
     CsrfExemptMixin,
     FormInvalidMessageMixin,
@@ -35,40 +61,88 @@ from ._other import (
     StaticContextMixin,
     HeaderMixin
 )
+from ._permissions import (
+    CachePermissionStore,
+    LocalPermissionStore,
+    bump_permission_versions
+)
+from ._remote import (
+    CircuitBreaker,
+    PolicyDecisionClient,
+    RemotePolicyBackend
+)
+from ._throttling import (
+    CacheRateLimitStore,
+    InMemoryRateLimitStore,
+    RateLimitMixin
+)
 from ._queries import (
+    CachedObjectMixin,
     OrderableListMixin,
     PrefetchRelatedMixin,
     SelectRelatedMixin
 )
 
 __all__ = [
+    'AccessAuditLog',
+    'AccessDecisionCache',
+    'AccessRule',
     'AjaxResponseMixin',
+    'AllOf',
     'AllVerbsMixin',
     'AnonymousRequiredMixin',
+    'AnyOf',
+    'Authenticated',
+    'CachePermissionStore',
+    'CacheRateLimitStore',
+    'CachedObjectMixin',
     'CanonicalSlugDetailMixin',
+    'CircuitBreaker',
     'CsrfExemptMixin',
     'FormInvalidMessageMixin',
     'FormMessagesMixin',
     'FormValidMessageMixin',
     'GroupRequiredMixin',
+    'HasPerm',
     'HeaderMixin',
+    'InGroup',
+    'InMemoryRateLimitStore',
+    'JSONEngine',
     'JSONRequestResponseMixin',
     'JsonRequestResponseMixin',
     'JSONResponseMixin',
+    'LocalPermissionStore',
     'LoginRequiredMixin',
     'MessageMixin',
+    'ModelAuditSink',
     'MultiplePermissionsRequiredMixin',
+    'Not',
+    'ObjectPermissionsListMixin',
+    'OrjsonJSONEngine',
     'OrderableListMixin',
+    'PassesTest',
     'PermissionRequiredMixin',
+    'PermissionsContextMixin',
+    'PermissionsMap',
+    'PolicyDecisionClient',
+    'PolicyRequiredMixin',
     'PrefetchRelatedMixin',
+    'PreloadUserAccessMixin',
+    'RateLimitMixin',
     'SelectRelatedMixin',
     'SetHeadlineMixin',
+    'Staff',
     'StaffuserRequiredMixin',
     'StaticContextMixin',
+    'StdlibJSONEngine',
     'SuccessURLRedirectListMixin',
+    'Superuser',
     'SuperuserRequiredMixin',
     'UserFormKwargsMixin',
     'UserPassesTestMixin',
     'SSLRequiredMixin',
-    'RecentLoginRequiredMixin'
+    'RecentLoginRequiredMixin',
+    'RemotePolicyBackend',
+    'bump_permission_versions',
+    'get_access_cache'
 ]
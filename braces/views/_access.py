@@ -1,18 +1,534 @@
 import inspect
 import datetime
-import re
+import hashlib
+import uuid
+from collections import Counter, defaultdict
 
 from django.conf import settings
-from django.contrib.auth import REDIRECT_FIELD_NAME
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 REDIRECT_FIELD_NAME, SESSION_KEY,
+                                 get_backends, get_user_model)
+from django.contrib.auth.models import Group, Permission
 from django.contrib.auth.views import redirect_to_login, logout_then_login
+from django.core.cache import caches
 from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.db.models import CharField, Value
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.http import (HttpResponseRedirect, HttpResponsePermanentRedirect,
-                         Http404, HttpResponse, StreamingHttpResponse)
+                         Http404, HttpResponse, QueryDict,
+                         StreamingHttpResponse)
 from django.shortcuts import resolve_url
 from django.utils import six
 from django.utils.encoding import force_text
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.http import urlquote
+from django.utils.six.moves.urllib.parse import urlparse, urlunparse
 from django.utils.timezone import now
 
+from ._config import get_class_config
+from ._permissions import (PermissionIndex, PermissionSnapshot,
+                           is_permission_pattern)
+
+
+def _user_key(user):
+    """
+    Returns a hashable key identifying `user` within a request.
+    """
+    return (user.__class__, getattr(user, 'pk', None))
+
+
+def _object_key(obj):
+    """
+    Returns a hashable key identifying `obj` for permission lookups.
+    Saved model instances are keyed by class and primary key, anything
+    else by identity.
+    """
+    if obj is None:
+        return None
+    pk = getattr(obj, 'pk', None)
+    if pk is not None:
+        return (obj.__class__, pk)
+    return id(obj)
+
+
+def _is_active_superuser(user):
+    return (getattr(user, 'is_active', False) and
+            getattr(user, 'is_superuser', False))
+
+
+def _get_backends_with(method):
+    """
+    Returns the auth backends if every one of them implements `method`,
+    otherwise None.
+    """
+    backends = get_backends()
+    if all(hasattr(backend, method) for backend in backends):
+        return backends
+    return None
+
+
+def _batch_granted_perms(user, perms, obj=None):
+    """
+    Asks the auth backends for all of `perms` at once and returns the set
+    of granted permissions, or None if no backend can answer in bulk.
+
+    Backends opt in by implementing `has_perms_batch(user_obj, perm_list,
+    obj=None)`, returning the permissions from `perm_list` they grant. The
+    others are asked with `has_perm` for each permission not granted yet.
+    """
+    if _is_active_superuser(user):
+        return set(perms)
+
+    backends = get_backends()
+    if not any(hasattr(backend, 'has_perms_batch') for backend in backends):
+        return None
+
+    granted, denied = set(), set()
+    for backend in backends:
+        pending = [perm for perm in perms
+                   if perm not in granted and perm not in denied]
+        if not pending:
+            break
+        if hasattr(backend, 'has_perms_batch'):
+            try:
+                granted.update(backend.has_perms_batch(user, pending, obj))
+            except PermissionDenied:
+                return set()
+            continue
+        if not hasattr(backend, 'has_perm'):
+            continue
+        for perm in pending:
+            try:
+                if backend.has_perm(user, perm, obj):
+                    granted.add(perm)
+            except PermissionDenied:
+                # Django stops asking the other backends for this one.
+                denied.add(perm)
+    return granted
+
+
+def _batch_granted_object_perms(user, perms, objects):
+    """
+    Asks every auth backend for `perms` on all of `objects` at once and
+    returns a dict mapping object primary keys to their granted
+    permissions, or None if a backend can't answer in bulk.
+
+    Backends opt in by implementing `get_objects_perms(user_obj, perm_list,
+    objects)`, returning a dict of primary key to granted permissions.
+    """
+    if _is_active_superuser(user):
+        return dict((obj.pk, set(perms)) for obj in objects)
+
+    backends = _get_backends_with('get_objects_perms')
+    if backends is None:
+        return None
+
+    granted = defaultdict(set)
+    for backend in backends:
+        try:
+            backend_perms = backend.get_objects_perms(user, perms, objects)
+        except PermissionDenied:
+            return {}
+        for pk, obj_perms in backend_perms.items():
+            granted[pk].update(obj_perms)
+    return granted
+
+
+def filter_queryset_by_perm(user, perm, queryset):
+    """
+    Returns `queryset` narrowed to the objects `user` has `perm` on.
+
+    If every auth backend implements `filter_objects_by_perm(user_obj,
+    perm, queryset)` the filtering happens in the database. Otherwise the
+    whole queryset is fetched once and checked object by object, and the
+    result is filtered by the primary keys of the permitted objects.
+    """
+    if _is_active_superuser(user):
+        return queryset
+
+    backends = _get_backends_with('filter_objects_by_perm')
+    if backends is not None:
+        filtered = queryset.none()
+        for backend in backends:
+            try:
+                filtered |= backend.filter_objects_by_perm(
+                    user, perm, queryset)
+            except PermissionDenied:
+                return queryset.none()
+        return filtered
+
+    objects = list(queryset)
+    granted = _batch_granted_object_perms(user, [perm], objects)
+    if granted is None:
+        pks = [obj.pk for obj in objects if user.has_perm(perm, obj)]
+    else:
+        pks = [pk for pk, obj_perms in granted.items() if perm in obj_perms]
+    return queryset.filter(pk__in=pks)
+
+
+GROUP_VERSION_KEY = 'braces:groups:version'
+USER_GROUP_VERSION_KEY = 'braces:groups:version:{0}'
+
+
+def _get_group_cache():
+    """
+    Returns the cache configured with `settings.BRACES_GROUP_CACHE` to hold
+    group memberships across requests, or None if there isn't one.
+    """
+    alias = getattr(settings, 'BRACES_GROUP_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def _get_group_versions(cache, user_pk):
+    """
+    Returns the global and the per-user membership versions, creating any
+    that are missing so an evicted version never revives old entries.
+    """
+    keys = [GROUP_VERSION_KEY, USER_GROUP_VERSION_KEY.format(user_pk)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return versions[keys[0]], versions[keys[1]]
+
+
+def bump_group_versions(user_pks=None):
+    """
+    Invalidates the cached group memberships of the users in `user_pks`, or
+    of every user if `user_pks` is None.
+    """
+    cache = _get_group_cache()
+    if cache is None:
+        return
+    if user_pks is None:
+        keys = [GROUP_VERSION_KEY]
+    else:
+        keys = [USER_GROUP_VERSION_KEY.format(pk) for pk in user_pks]
+    cache.set_many(dict((key, uuid.uuid4().hex) for key in keys), None)
+
+
+_group_closure = {'hierarchy': None, 'closure': {}}
+
+
+def _build_group_closure(hierarchy):
+    """
+    Returns the closure of `hierarchy`, a dict mapping each group name to a
+    frozenset of itself and every group nested under it, at any depth.
+    """
+    closure = {}
+
+    def descendants(name, path):
+        if name in path:
+            raise ImproperlyConfigured(
+                'BRACES_GROUP_HIERARCHY has a cycle through '
+                '"{0}".'.format(name))
+        if name not in closure:
+            names = set([name])
+            for child in hierarchy.get(name, ()):
+                names.update(descendants(child, path + (name,)))
+            closure[name] = frozenset(names)
+        return closure[name]
+
+    for name in hierarchy:
+        descendants(name, ())
+    return closure
+
+
+def expand_group_names(groups):
+    """
+    Returns `groups` together with every group nested under them in
+    `settings.BRACES_GROUP_HIERARCHY`, which maps a group name to the names
+    of its child groups. The closure is computed once per hierarchy, so
+    this is a dict lookup per group.
+    """
+    hierarchy = getattr(settings, 'BRACES_GROUP_HIERARCHY', None)
+    if not hierarchy:
+        return frozenset(groups)
+    if _group_closure['hierarchy'] is not hierarchy:
+        _group_closure['closure'] = _build_group_closure(hierarchy)
+        _group_closure['hierarchy'] = hierarchy
+    closure = _group_closure['closure']
+    return frozenset().union(
+        *[closure.get(name, (name,)) for name in groups])
+
+
+def is_member_of_any(user, groups, timeout=None):
+    """
+    Returns whether `user` belongs to at least one of the groups named in
+    `groups`, using a single EXISTS query. The answer is kept in the
+    `BRACES_GROUP_CACHE` cache, if configured, until the user's groups or
+    any group change.
+    """
+    def probe():
+        return user.groups.filter(name__in=groups).exists()
+
+    cache = _get_group_cache()
+    if cache is None:
+        return probe()
+
+    global_version, user_version = _get_group_versions(cache, user.pk)
+    digest = hashlib.md5(
+        '\0'.join(sorted(groups)).encode('utf-8')).hexdigest()
+    key = 'braces:groups:{0}:{1}:{2}:{3}'.format(
+        user.pk, user_version, global_version, digest)
+    in_group = cache.get(key)
+    if in_group is None:
+        in_group = probe()
+        if timeout is None:
+            # Django's caches read a None timeout as "never expire".
+            cache.set(key, in_group)
+        else:
+            cache.set(key, in_group, timeout)
+    return in_group
+
+
+@receiver(m2m_changed)
+def _user_groups_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    groups = getattr(get_user_model(), 'groups', None)
+    if sender is not getattr(groups, 'through', None):
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        bump_group_versions([instance.pk])
+    elif pk_set:
+        bump_group_versions(pk_set)
+    else:
+        # group.user_set.clear() doesn't tell us who the members were.
+        bump_group_versions()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def _group_changed(sender, instance, created=False, **kwargs):
+    # A new group has no members yet; renames and deletions affect all.
+    if not created:
+        bump_group_versions()
+
+
+def _kind(kind):
+    return Value(kind, output_field=CharField())
+
+
+def load_groups_and_permissions(user):
+    """
+    Fetches the names of `user`'s groups, its own permissions and its
+    groups' permissions in a single UNION query.
+
+    Returns `(group_names, user_perms, group_perms)`, three sets, with
+    permissions as "app_label.codename" strings.
+    """
+    fields = ('kind', 'content_type__app_label', 'codename')
+    user_perms = Permission.objects.filter(user=user).order_by().annotate(
+        kind=_kind('user')).values_list(*fields)
+    group_perms = Permission.objects.filter(
+        group__user=user).order_by().annotate(
+        kind=_kind('group')).values_list(*fields)
+    groups = Group.objects.filter(user=user).order_by().annotate(
+        kind=_kind('name')).values_list('kind', 'name', 'name')
+
+    result = {'user': set(), 'group': set(), 'name': set()}
+    for kind, app_label, name in user_perms.union(
+            group_perms, groups, all=True):
+        if kind == 'name':
+            result[kind].add(name)
+        else:
+            result[kind].add('{0}.{1}'.format(app_label, name))
+    return result['name'], result['user'], result['group']
+
+
+class AccessDecisionCache(object):
+    """
+    Memoizes permission and group decisions for the lifetime of a single
+    request, so stacked access mixins and template helpers only ask the
+    auth backends once per `(user, perm, obj)`.
+
+    Use `get_access_cache(request)` to get the instance attached to a
+    request. `hits` and `misses` count lookups answered from the cache
+    and lookups that had to be computed.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._decisions = {}
+
+    def get_or_compute(self, key, func):
+        """
+        Returns the decision stored under `key`, computing it with `func`
+        on the first lookup.
+        """
+        try:
+            value = self._decisions[key]
+        except KeyError:
+            self.misses += 1
+            value = self._decisions[key] = func()
+        else:
+            self.hits += 1
+        return value
+
+    def is_cached(self, key):
+        return key in self._decisions
+
+    def _perm_key(self, user, perm, obj=None):
+        return ('perm', _user_key(user), perm, _object_key(obj))
+
+    def has_perm(self, user, perm, obj=None):
+        key = self._perm_key(user, perm, obj)
+        return self.get_or_compute(
+            key, lambda: self._compute_perm(user, perm, obj))
+
+    def _compute_perm(self, user, perm, obj=None):
+        if is_permission_pattern(perm):
+            if not user.is_active:
+                return False
+            return user.is_superuser or self.get_permission_index(
+                user, obj).matches(perm)
+        if obj is None:
+            snapshot = self.get_permission_snapshot(user)
+            if snapshot is not None:
+                return user.is_active and (
+                    user.is_superuser or perm in snapshot)
+        return user.has_perm(perm, obj)
+
+    def set_permission_snapshot(self, user, perms):
+        """
+        Answers later global (not object) permission checks for `user`
+        from `perms`, the set of all the user's permissions, instead of
+        asking the auth backends.
+        """
+        self._decisions[('snapshot', _user_key(user))] = perms
+
+    def get_permission_snapshot(self, user):
+        return self._decisions.get(('snapshot', _user_key(user)))
+
+    def get_permission_index(self, user, obj=None):
+        """
+        Returns the `PermissionIndex` of `user`'s permissions, on `obj` if
+        given, built once per request or once per permission snapshot.
+        """
+        def build():
+            perms = None
+            if obj is None:
+                perms = self.get_permission_snapshot(user)
+            if perms is None:
+                perms = user.get_all_permissions(obj)
+            if isinstance(perms, PermissionSnapshot):
+                return perms.index
+            return PermissionIndex(perms)
+
+        key = ('index', _user_key(user), _object_key(obj))
+        return self.get_or_compute(key, build)
+
+    def has_cached_perm(self, user, perm, obj=None):
+        """
+        Returns whether the decision for `perm` is already known.
+        """
+        return self.is_cached(self._perm_key(user, perm, obj))
+
+    def prefetch_perms(self, user, perms, obj=None):
+        """
+        Resolves the decisions for `perms` that aren't cached yet in one
+        round trip to each auth backend supporting `has_perms_batch`.
+        Returns False if none of them does, in which case nothing is
+        resolved.
+        """
+        missing = [perm for perm in perms
+                   if not is_permission_pattern(perm)
+                   and not self.has_cached_perm(user, perm, obj)]
+        if len(missing) < 2:
+            return True
+        if obj is None and self.get_permission_snapshot(user) is not None:
+            return True
+
+        granted = _batch_granted_perms(user, missing, obj)
+        if granted is None:
+            return False
+
+        for perm in missing:
+            self._decisions[self._perm_key(user, perm, obj)] = perm in granted
+        self.misses += len(missing)
+        return True
+
+    def prefetch_object_perms(self, user, perms, objects):
+        """
+        Resolves `perms` on every one of `objects` in one round trip to the
+        auth backends, when they all support `get_objects_perms`. Returns
+        False if the backends can't batch, in which case nothing is
+        resolved.
+        """
+        perms = [perm for perm in perms if not is_permission_pattern(perm)]
+        missing = [obj for obj in objects
+                   if not all(self.has_cached_perm(user, perm, obj)
+                              for perm in perms)]
+        if not missing:
+            return True
+
+        granted = _batch_granted_object_perms(user, perms, missing)
+        if granted is None:
+            return False
+
+        for obj in missing:
+            obj_perms = granted.get(obj.pk, ())
+            for perm in perms:
+                key = self._perm_key(user, perm, obj)
+                self._decisions[key] = perm in obj_perms
+        self.misses += len(missing) * len(perms)
+        return True
+
+    def has_perms(self, user, perms, obj=None):
+        return all(self.has_perm(user, perm, obj) for perm in perms)
+
+    def get_group_names(self, user):
+        """
+        Returns the names of the groups `user` belongs to as a frozenset.
+        """
+        key = ('groups', _user_key(user))
+        return self.get_or_compute(key, lambda: frozenset(
+            user.groups.values_list('name', flat=True)))
+
+    def set_group_names(self, user, names):
+        """
+        Stores the names of the groups `user` belongs to, e.g. when they
+        were loaded along with the user.
+        """
+        self._decisions[('groups', _user_key(user))] = frozenset(names)
+
+    def in_any_group(self, user, groups, timeout=None):
+        """
+        Returns whether `user` belongs to at least one of `groups`, or to a
+        group nested under them, reusing the user's group names if they
+        were already fetched.
+        """
+        groups = expand_group_names(groups)
+        names_key = ('groups', _user_key(user))
+        if self.is_cached(names_key):
+            return bool(self.get_group_names(user).intersection(groups))
+        key = ('in_groups', _user_key(user), groups)
+        return self.get_or_compute(
+            key, lambda: is_member_of_any(user, groups, timeout))
+
+    def clear(self):
+        """
+        Forgets every stored decision, e.g. after changing a user's
+        permissions mid-request. The counters are left untouched.
+        """
+        self._decisions.clear()
+
+
+def get_access_cache(request):
+    """
+    Returns the `AccessDecisionCache` for `request`, creating it on first
+    use.
+    """
+    cache = getattr(request, '_braces_access_cache', None)
+    if cache is None:
+        cache = request._braces_access_cache = AccessDecisionCache()
+    return cache
+
 
 class AccessMixin(object):
     """
@@ -23,6 +539,10 @@ class AccessMixin(object):
     raise_exception = False
     redirect_field_name = REDIRECT_FIELD_NAME  # Set by django.contrib.auth
     redirect_unauthenticated_users = False
+    audit_log = None
+    fast_denial = False
+    fast_denial_status = None
+    fast_denial_max_age = 60
 
     def get_login_url(self):
         """
@@ -48,7 +568,117 @@ class AccessMixin(object):
                     self.__class__.__name__))
         return self.redirect_field_name
 
+    def get_login_redirect_parts(self):
+        """
+        Returns the resolved login URL up to the redirect field's value, and
+        its fragment, for the quoted path to be put between. It's computed
+        once per view class and login settings. Returns None if the login
+        URL already has the redirect field, leaving the redirect to
+        `redirect_to_login()`.
+        """
+        cls = self.__class__
+        cached = cls.__dict__.get('_braces_login_redirects')
+        if cached is None:
+            cached = {}
+            setattr(cls, '_braces_login_redirects', cached)
+
+        key = (self.login_url, self.redirect_field_name, settings.LOGIN_URL)
+        if key not in cached:
+            redirect_field_name = self.get_redirect_field_name()
+            url_parts = list(urlparse(
+                force_text(resolve_url(self.get_login_url()))))
+            # Built the way redirect_to_login() does, so that the
+            # Location is the same.
+            querystring = QueryDict(url_parts[4], mutable=True)
+            if not redirect_field_name or redirect_field_name in querystring:
+                cached[key] = None
+            else:
+                query = querystring.urlencode(safe='/')
+                url_parts[4] = '{0}{1}{2}='.format(
+                    query, '&' if query else '',
+                    urlquote(redirect_field_name, safe='/'))
+                fragment = url_parts[5]
+                url_parts[5] = ''
+                cached[key] = (urlunparse(url_parts),
+                               '#' + fragment if fragment else '')
+        return cached[key]
+
+    def is_browser_request(self, request):
+        return 'text/html' in request.META.get('HTTP_ACCEPT', '')
+
+    def fast_denial_response(self, request):
+        """
+        Returns the response for a denied request in `fast_denial` mode: a
+        bare redirect to the login page for browsers, and for other clients
+        an empty, cacheable `fast_denial_status` response if one is set.
+        """
+        status = self.fast_denial_status
+        if status is not None and not self.is_browser_request(request):
+            response = HttpResponse(status=status)
+            # Denials depend on the credentials, so shared caches mustn't
+            # store them.
+            response['Cache-Control'] = 'private, max-age={0}'.format(
+                self.fast_denial_max_age)
+            response['Vary'] = 'Accept, Authorization, Cookie'
+            return response
+
+        parts = self.get_login_redirect_parts()
+        if parts is None:
+            return redirect_to_login(request.get_full_path(),
+                                     self.get_login_url(),
+                                     self.get_redirect_field_name())
+        response = HttpResponse(status=302)
+        response['Location'] = '{0}{1}{2}'.format(
+            parts[0], urlquote(request.get_full_path(), safe='/'), parts[1])
+        return response
+
+    def get_audit_log(self):
+        """
+        Override this method to customize where access decisions are
+        recorded. None records nothing.
+        """
+        return self.audit_log
+
+    def get_audit_record(self, request, granted, check=None):
+        """
+        Returns the dict recorded for an access decision.
+        """
+        user = getattr(request, 'user', None)
+        user_id = username = None
+        if user is not None and user.is_authenticated:
+            user_id, username = user.pk, user.get_username()
+        return {
+            'timestamp': now(),
+            'user_id': user_id,
+            'username': username,
+            'view': '{0}.{1}'.format(self.__class__.__module__,
+                                     self.__class__.__name__),
+            'check': check,
+            'method': request.method,
+            'path': request.path,
+            'granted': granted,
+        }
+
+    def audit_access(self, request, granted, check=None):
+        """
+        Records an access decision in the audit log, if there is one.
+        """
+        audit_log = self.get_audit_log()
+        if audit_log is not None:
+            audit_log.record(self.get_audit_record(request, granted, check))
+
+    def deny_access(self, request, check):
+        """
+        Records that `check`, the name of the mixin or test, denied the
+        request and returns `handle_no_permission()`'s response.
+        """
+        self.audit_access(request, False, check)
+        self._braces_denial_audited = True
+        return self.handle_no_permission(request)
+
     def handle_no_permission(self, request):
+        if not self.__dict__.pop('_braces_denial_audited', False):
+            self.audit_access(request, False)
         if self.raise_exception:
             if (self.redirect_unauthenticated_users
                     and not request.user.is_authenticated):
@@ -72,23 +702,63 @@ class AccessMixin(object):
 
         By default we redirect to login.
         """
+        if self.fast_denial:
+            return self.fast_denial_response(request)
         return redirect_to_login(request.get_full_path(),
                                  self.get_login_url(),
                                  self.get_redirect_field_name())
 
 
+def _user_is_loaded(user):
+    """
+    Returns whether `user` is anything but a lazy user that hasn't been
+    evaluated yet.
+    """
+    return not (isinstance(user, SimpleLazyObject) and user._wrapped is empty)
+
+
+def _session_is_authenticated(request):
+    """
+    Returns whether the request's session holds a logged in user, judging
+    by the session's auth keys only. The user is not loaded, and without a
+    session cookie the session isn't read either.
+    """
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    session = request.session
+    return (session.get(SESSION_KEY) is not None
+            and session.get(HASH_SESSION_KEY) is not None
+            and session.get(BACKEND_SESSION_KEY)
+            in settings.AUTHENTICATION_BACKENDS)
+
+
 class LoginRequiredMixin(AccessMixin):
     """
     View mixin which verifies that the user is authenticated.
 
+    Set `session_authentication` to True to decide from the session alone,
+    so the user is only loaded if the view uses it.
+
     NOTE:
         This should be the left-most mixin of a view, except when
         combined with CsrfExemptMixin - which in that case should
         be the left-most mixin.
     """
+    session_authentication = False
+
+    def is_authenticated(self, request):
+        """
+        Returns whether the request comes from an authenticated user.
+        """
+        user = request.user
+        if (self.session_authentication and not _user_is_loaded(user)
+                and hasattr(request, 'session')):
+            return _session_is_authenticated(request)
+        return user.is_authenticated
+
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return self.handle_no_permission(request)
+        if not self.is_authenticated(request):
+            return self.deny_access(request, 'LoginRequiredMixin')
 
         return super(LoginRequiredMixin, self).dispatch(
             request, *args, **kwargs)
@@ -137,7 +807,9 @@ class PermissionRequiredMixin(AccessMixin):
     permission.
 
     Class Settings
-    `permission_required` - the permission to check for.
+    `permission_required` - the permission to check for. A pattern ending
+        in "*", such as "blog.*" or "blog.change_*", is satisfied by any
+        permission starting with it.
     `login_url` - the login url of site
     `redirect_field_name` - defaults to "next"
     `raise_exception` - defaults to False - raise 403 if set to True
@@ -157,6 +829,32 @@ class PermissionRequiredMixin(AccessMixin):
     """
     permission_required = None  # Default required perms to none
     object_level_permissions = False
+    permission_store = None
+    permission_check = 'PermissionRequiredMixin'
+
+    def get_permission_store(self):
+        """
+        Override this method to customize where permission snapshots are
+        kept across requests. None disables snapshots.
+        """
+        return self.permission_store
+
+    def load_permission_snapshot(self, request):
+        """
+        Loads the user's permission snapshot from the permission store into
+        the request's access cache.
+        """
+        store = self.get_permission_store()
+        user = request.user
+        if store is None or not user.is_authenticated:
+            return
+        # A snapshot only holds what `get_all_permissions()` reports, so a
+        # backend answering through `has_perm()` alone must be asked.
+        if _get_backends_with('get_all_permissions') is None:
+            return
+        cache = get_access_cache(request)
+        if cache.get_permission_snapshot(user) is None:
+            cache.set_permission_snapshot(user, store.get_snapshot(user))
 
     def get_permission_required(self, request=None):
         """
@@ -178,15 +876,19 @@ class PermissionRequiredMixin(AccessMixin):
         Returns whether or not the user has permissions
         """
         perms = self.get_permission_required(request)
+        self.load_permission_snapshot(request)
+        cache = get_access_cache(request)
         has_permission = False
 
-        if self.object_level_permissions: 
-            if hasattr(self, 'object')  and self.object is not None: 
-                has_permission = request.user.has_perm(self.get_permission_required(request), self.object)
+        if self.object_level_permissions:
+            if hasattr(self, 'object') and self.object is not None:
+                has_permission = cache.has_perm(
+                    request.user, perms, self.object)
             elif hasattr(self, 'get_object') and callable(self.get_object):
-                has_permission = request.user.has_perm(self.get_permission_required(request), self.get_object())
+                has_permission = cache.has_perm(
+                    request.user, perms, self.get_object())
         else:
-            has_permission = request.user.has_perm(self.get_permission_required(request))
+            has_permission = cache.has_perm(request.user, perms)
         return has_permission
 
     def dispatch(self, request, *args, **kwargs):
@@ -197,8 +899,9 @@ class PermissionRequiredMixin(AccessMixin):
         has_permission = self.check_permissions(request)
 
         if not has_permission:
-            return self.handle_no_permission(request)
+            return self.deny_access(request, self.permission_check)
 
+        self.audit_access(request, True, self.permission_check)
         return super(PermissionRequiredMixin, self).dispatch(
             request, *args, **kwargs)
 
@@ -240,15 +943,27 @@ class MultiplePermissionsRequiredMixin(PermissionRequiredMixin):
             login_url = "/signup/"
             redirect_field_name = "hollaback"
             raise_exception = True
+            permissions_order = "most_denied"
     """
     permissions = None  # Default required perms to none
+    permissions_order = None  # Check permissions in the declared order
+    permission_check = 'MultiplePermissionsRequiredMixin'
 
     def get_permission_required(self, request=None):
-        self._check_permissions_attr()
+        get_class_config(self, 'permissions', self.permissions,
+                         self._normalize_permissions)
         return self.permissions
 
-    def check_permissions(self, request):
-        permissions = self.get_permission_required(request)
+    def _normalize_permissions(self, permissions):
+        """
+        Validates a `permissions` dict and returns its `all` and `any`
+        permissions as tuples, or None for a missing key.
+        """
+        if permissions is None or not isinstance(permissions, dict):
+            raise ImproperlyConfigured(
+                '{0} requires the "permissions" attribute to be set as a '
+                'dict.'.format(self.__class__.__name__))
+
         perms_all = permissions.get('all') or None
         perms_any = permissions.get('any') or None
 
@@ -256,16 +971,79 @@ class MultiplePermissionsRequiredMixin(PermissionRequiredMixin):
         self._check_perms_keys("all", perms_all)
         self._check_perms_keys("any", perms_any)
 
+        return (tuple(perms_all) if perms_all else None,
+                tuple(perms_any) if perms_any else None)
+
+    def get_permissions_order(self):
+        """
+        Override this method to customize the short-circuit ordering policy.
+        """
+        return get_class_config(self, 'permissions_order',
+                                self.permissions_order,
+                                self._normalize_permissions_order)
+
+    def _normalize_permissions_order(self, order):
+        if order not in (None, 'cheapest', 'most_denied'):
+            raise ImproperlyConfigured(
+                '{0}.permissions_order must be None, "cheapest" or '
+                '"most_denied".'.format(self.__class__.__name__))
+        return order
+
+    def _get_permission_denials(self):
+        """
+        Returns the per-view-class count of denials for each permission.
+        """
+        cls = self.__class__
+        if '_permission_denials' not in cls.__dict__:
+            cls._permission_denials = Counter()
+        return cls._permission_denials
+
+    def order_permissions(self, request, perms, key):
+        """
+        Returns `perms` in the order they should be checked. With the
+        "cheapest" policy decisions that are already cached come first. With
+        "most_denied", `all` permissions that are denied most often for this
+        view come first and `any` permissions that are denied least often do.
+        """
+        order = self.get_permissions_order()
+        if order == 'cheapest':
+            cache = get_access_cache(request)
+            return sorted(perms, key=lambda perm: not cache.has_cached_perm(
+                request.user, perm))
+        if order == 'most_denied':
+            denials = self._get_permission_denials()
+            sign = -1 if key == 'all' else 1
+            return sorted(perms, key=lambda perm: sign * denials[perm])
+        return perms
+
+    def _has_perm(self, request, perm):
+        has_perm = get_access_cache(request).has_perm(request.user, perm)
+        if not has_perm and self.get_permissions_order() == 'most_denied':
+            self._get_permission_denials()[perm] += 1
+        return has_perm
+
+    def check_permissions(self, request):
+        permissions = self.get_permission_required(request)
+        perms_all, perms_any = get_class_config(
+            self, 'permissions', permissions, self._normalize_permissions)
+
+        self.load_permission_snapshot(request)
+
+        # Resolve both sets in a single backend call when possible.
+        get_access_cache(request).prefetch_perms(
+            request.user, list(perms_all or ()) + list(perms_any or ()))
+
         # If perms_all, check that user has all permissions in the list/tuple
         if perms_all:
-            if not request.user.has_perms(perms_all):
-                return False
+            for perm in self.order_permissions(request, perms_all, 'all'):
+                if not self._has_perm(request, perm):
+                    return False
 
         # If perms_any, check that user has at least one in the list/tuple
         if perms_any:
             has_one_perm = False
-            for perm in perms_any:
-                if request.user.has_perm(perm):
+            for perm in self.order_permissions(request, perms_any, 'any'):
+                if self._has_perm(request, perm):
                     has_one_perm = True
                     break
 
@@ -274,15 +1052,6 @@ class MultiplePermissionsRequiredMixin(PermissionRequiredMixin):
 
         return True
 
-    def _check_permissions_attr(self):
-        """
-        Check permissions attribute is set and that it is a dict.
-        """
-        if self.permissions is None or not isinstance(self.permissions, dict):
-            raise ImproperlyConfigured(
-                '{0} requires the "permissions" attribute to be set as a '
-                'dict.'.format(self.__class__.__name__))
-
     def _check_permissions_keys_set(self, perms_all=None, perms_any=None):
         """
         Check to make sure the keys `any` or `all` are not both blank.
@@ -306,12 +1075,189 @@ class MultiplePermissionsRequiredMixin(PermissionRequiredMixin):
                 'list or tuple.'.format(self.__class__.__name__, key))
 
 
+class ObjectPermissionsListMixin(object):
+    """
+    Mixin for list views that only lists the objects the user has
+    `object_permission_required` on, and sets `allowed_perms`, a frozenset
+    of the `object_permissions` the user has, on every object of the page.
+
+    Permissions are resolved with one call per auth backend when the
+    backends support it; see the documentation for the backend methods.
+
+    Example Usage
+
+        class ArticleListView(ObjectPermissionsListMixin, ListView):
+            model = Article
+            object_permission_required = "blog.view_article"
+            object_permissions = ("blog.change_article",
+                                  "blog.delete_article")
+    """
+    object_permission_required = None
+    object_permissions = ()
+
+    def get_object_permission_required(self):
+        """
+        Override this method to customize the permission objects are
+        filtered by. None lists every object.
+        """
+        return self.object_permission_required
+
+    def get_object_permissions(self):
+        """
+        Override this method to customize the permissions set on each
+        object as `allowed_perms`.
+        """
+        return self.object_permissions
+
+    def get_queryset(self):
+        queryset = super(ObjectPermissionsListMixin, self).get_queryset()
+        perm = self.get_object_permission_required()
+        if perm is None:
+            return queryset
+        return filter_queryset_by_perm(self.request.user, perm, queryset)
+
+    def annotate_object_perms(self, objects, perms):
+        """
+        Sets `allowed_perms` on each of `objects`.
+        """
+        user = self.request.user
+        cache = get_access_cache(self.request)
+        objects = list(objects)
+        cache.prefetch_object_perms(user, perms, objects)
+        for obj in objects:
+            obj.allowed_perms = frozenset(
+                perm for perm in perms if cache.has_perm(user, perm, obj))
+
+    def get_context_data(self, **kwargs):
+        context = super(ObjectPermissionsListMixin, self).get_context_data(
+            **kwargs)
+        perms = self.get_object_permissions()
+        if perms:
+            self.annotate_object_perms(context['object_list'], perms)
+        return context
+
+
+class _AppPermissions(dict):
+    """
+    The codenames of an app's context permissions, mapped to whether the
+    user has them. It's true if any of them is granted, as Django's
+    `{% if perms.app_label %}` is when the user has any permission in the
+    app.
+    """
+    def __bool__(self):
+        return any(self.values())
+    __nonzero__ = __bool__
+
+
+class PermissionsMap(dict):
+    """
+    `{app_label: {codename: bool}}` for the context permissions of
+    `PermissionsContextMixin`, which also answers
+    `{% if "app_label.codename" in perms %}` and
+    `{% if "app_label" in perms %}` as Django's `perms` does.
+    """
+    def __contains__(self, perm):
+        app_label, _, codename = perm.partition('.')
+        app_perms = self.get(app_label)
+        if app_perms is None:
+            return False
+        if not codename:
+            return bool(app_perms)
+        return bool(app_perms.get(codename))
+
+
+class PermissionsContextMixin(object):
+    """
+    Mixin which puts the permissions a template needs in its context as a
+    plain dict, resolved in one batch, so `{% if perms.app.codename %}`
+    never reaches the auth backends while rendering.
+
+    Permissions already resolved by the access mixins are reused, and
+    permissions that weren't declared read as False.
+
+    Class Settings
+        `context_permissions` - a list or tuple of "app_label.codename"
+            permissions.
+        `context_permissions_name` - the context variable to use. Defaults
+            to "perms", replacing Django's lazy `perms` for the view's
+            template.
+
+    Example Usage
+
+        class DashboardView(PermissionsContextMixin, TemplateView):
+            context_permissions = ("blog.add_article", "blog.publish_article")
+    """
+    context_permissions = None
+    context_permissions_name = 'perms'
+
+    def get_context_permissions(self):
+        return get_class_config(
+            self, 'context_permissions', self.context_permissions,
+            self._normalize_context_permissions)
+
+    def _normalize_context_permissions(self, perms):
+        """
+        Validates `perms` and returns it as a tuple of
+        `(permission, app_label, codename)` tuples.
+        """
+        if not isinstance(perms, (list, tuple)) or not all(
+                isinstance(perm, six.string_types) and '.' in perm
+                for perm in perms):
+            raise ImproperlyConfigured(
+                '{0} requires the "context_permissions" attribute to be set '
+                'as a list or tuple of "app_label.codename" '
+                'strings.'.format(self.__class__.__name__))
+        return tuple((perm,) + tuple(perm.split('.', 1)) for perm in perms)
+
+    def get_permissions_map(self):
+        """
+        Returns a `PermissionsMap`, `{app_label: {codename: bool}}`, for
+        the context permissions.
+        """
+        perms = self.get_context_permissions()
+        user = self.request.user
+        cache = get_access_cache(self.request)
+        cache.prefetch_perms(user, [perm for perm, _, _ in perms])
+
+        permissions_map = PermissionsMap()
+        for perm, app_label, codename in perms:
+            app_perms = permissions_map.get(app_label)
+            if app_perms is None:
+                app_perms = permissions_map[app_label] = _AppPermissions()
+            app_perms[codename] = cache.has_perm(user, perm)
+        return permissions_map
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault(self.context_permissions_name,
+                          self.get_permissions_map())
+        return super(PermissionsContextMixin, self).get_context_data(
+            **kwargs)
+
+
 class GroupRequiredMixin(AccessMixin):
+    """
+    View mixin which verifies that the logged in user belongs to at least
+    one of the specified groups.
+
+    Class Settings
+        `group_required` - a group name or a list or tuple of group names.
+        `group_cache_timeout` - seconds to keep a membership answer in
+            `settings.BRACES_GROUP_CACHE`, if configured. None uses the
+            cache's default timeout.
+    """
     group_required = None
+    group_cache_timeout = None
 
     def get_group_required(self):
-        if self.group_required is None or (
-                not isinstance(self.group_required,
+        return get_class_config(self, 'group_required', self.group_required,
+                                self._normalize_group_required)
+
+    def _normalize_group_required(self, group_required):
+        """
+        Validates `group_required` and returns it as a tuple of names.
+        """
+        if group_required is None or (
+                not isinstance(group_required,
                                (list, tuple) + six.string_types)
         ):
 
@@ -319,16 +1265,16 @@ class GroupRequiredMixin(AccessMixin):
                 '{0} requires the "group_required" attribute to be set and be '
                 'one of the following types: string, unicode, list or '
                 'tuple'.format(self.__class__.__name__))
-        if not isinstance(self.group_required, (list, tuple)):
-            self.group_required = (self.group_required,)
-        return self.group_required
+        if not isinstance(group_required, (list, tuple)):
+            return (group_required,)
+        return tuple(group_required)
 
     def check_membership(self, groups):
         """ Check required group(s) """
         if self.request.user.is_superuser:
             return True
-        user_groups = self.request.user.groups.values_list("name", flat=True)
-        return set(groups).intersection(set(user_groups))
+        return get_access_cache(self.request).in_any_group(
+            self.request.user, groups, self.group_cache_timeout)
 
     def dispatch(self, request, *args, **kwargs):
         self.request = request
@@ -337,12 +1283,51 @@ class GroupRequiredMixin(AccessMixin):
             in_group = self.check_membership(self.get_group_required())
 
         if not in_group:
-            return self.handle_no_permission(request)
+            return self.deny_access(request, 'GroupRequiredMixin')
 
+        self.audit_access(request, True, 'GroupRequiredMixin')
         return super(GroupRequiredMixin, self).dispatch(
             request, *args, **kwargs)
 
 
+class PreloadUserAccessMixin(object):
+    """
+    View mixin which loads the authenticated user's group names and
+    permissions in one query before the access mixins run, so they don't
+    each query for them.
+
+    NOTE:
+        This should come before the access mixins it serves.
+    """
+    def preload_user_access(self, request):
+        """
+        Loads the group names into the request's `AccessDecisionCache` and
+        the permissions into the permission caches of Django's
+        `ModelBackend`.
+        """
+        user = request.user
+        if not user.is_authenticated or not hasattr(user, 'user_permissions'):
+            return
+        cache = get_access_cache(request)
+        if cache.is_cached(('groups', _user_key(user))):
+            return
+
+        group_names, user_perms, group_perms = load_groups_and_permissions(
+            user)
+        cache.set_group_names(user, group_names)
+        # ModelBackend gives active superusers every permission, which
+        # these sets don't reflect.
+        if not user.is_superuser and not hasattr(user, '_perm_cache'):
+            user._user_perm_cache = user_perms
+            user._group_perm_cache = group_perms
+            user._perm_cache = user_perms | group_perms
+
+    def dispatch(self, request, *args, **kwargs):
+        self.preload_user_access(request)
+        return super(PreloadUserAccessMixin, self).dispatch(
+            request, *args, **kwargs)
+
+
 class UserPassesTestMixin(AccessMixin):
     """
     CBV Mixin allows you to define test that every user should pass
@@ -369,20 +1354,250 @@ class UserPassesTestMixin(AccessMixin):
         user_test_result = self.get_test_func()(request.user)
 
         if not user_test_result:
-            return self.handle_no_permission(request)
+            return self.deny_access(request, 'UserPassesTestMixin')
 
+        self.audit_access(request, True, 'UserPassesTestMixin')
         return super(UserPassesTestMixin, self).dispatch(
             request, *args, **kwargs)
 
 
+class AccessRule(object):
+    """
+    Base class for the rules of an access policy. Rules are combined with
+    `&`, `|` and `~` and compiled by `PolicyRequiredMixin` into a single
+    check that evaluates the cheapest rules first and stops as soon as the
+    outcome is known.
+
+    Subclasses implement `check(view, request)` and set `cost` to a rough
+    estimate of how expensive that is: 0 for attributes of the user, higher
+    for anything that may hit a backend.
+    """
+    cost = 0
+
+    def __and__(self, other):
+        return AllOf(self, other)
+
+    def __or__(self, other):
+        return AnyOf(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def check(self, view, request):
+        raise NotImplementedError(
+            '{0} is missing implementation of the check method.'.format(
+                self.__class__.__name__))
+
+    def compile(self):
+        """
+        Returns a function of `(view, request)` that evaluates this rule.
+        """
+        return self.check
+
+    @property
+    def compiled(self):
+        """
+        The compiled check, built on first use and then reused by every
+        view sharing this policy.
+        """
+        if '_compiled' not in self.__dict__:
+            self._compiled = self.compile()
+        return self._compiled
+
+
+class _RuleGroup(AccessRule):
+    """
+    A rule made of other rules, flattening nested groups of the same kind.
+    """
+    def __init__(self, *rules):
+        self.rules = []
+        for rule in rules:
+            if isinstance(rule, self.__class__):
+                self.rules.extend(rule.rules)
+            else:
+                self.rules.append(rule)
+
+    @property
+    def cost(self):
+        return sum(rule.cost for rule in self.rules)
+
+    def _compile_rules(self):
+        return [rule.compile()
+                for rule in sorted(self.rules, key=lambda rule: rule.cost)]
+
+
+class AllOf(_RuleGroup):
+    """
+    Passes if every one of its rules passes.
+    """
+    def compile(self):
+        checks = self._compile_rules()
+
+        def check(view, request):
+            for rule_check in checks:
+                if not rule_check(view, request):
+                    return False
+            return True
+        return check
+
+
+class AnyOf(_RuleGroup):
+    """
+    Passes if at least one of its rules passes.
+    """
+    def compile(self):
+        checks = self._compile_rules()
+
+        def check(view, request):
+            for rule_check in checks:
+                if rule_check(view, request):
+                    return True
+            return False
+        return check
+
+
+class Not(AccessRule):
+    """
+    Passes if its rule fails.
+    """
+    def __init__(self, rule):
+        self.rule = rule
+
+    @property
+    def cost(self):
+        return self.rule.cost
+
+    def compile(self):
+        rule_check = self.rule.compile()
+        return lambda view, request: not rule_check(view, request)
+
+
+class Authenticated(AccessRule):
+    """
+    Passes for authenticated users.
+    """
+    def check(self, view, request):
+        return request.user.is_authenticated
+
+
+class Staff(AccessRule):
+    """
+    Passes for users with `is_staff` set to True.
+    """
+    def check(self, view, request):
+        return request.user.is_staff
+
+
+class Superuser(AccessRule):
+    """
+    Passes for users with `is_superuser` set to True.
+    """
+    def check(self, view, request):
+        return request.user.is_superuser
+
+
+class PassesTest(AccessRule):
+    """
+    Passes if `test_func(user)` returns True. `test_func` is either a
+    callable or the name of a method on the view.
+    """
+    cost = 1
+
+    def __init__(self, test_func='test_func'):
+        self.test_func = test_func
+
+    def check(self, view, request):
+        test_func = self.test_func
+        if isinstance(test_func, six.string_types):
+            test_func = getattr(view, test_func)
+        return test_func(request.user)
+
+
+class HasPerm(AccessRule):
+    """
+    Passes if the user has every one of the given permissions.
+    """
+    cost = 2
+
+    def __init__(self, *perms):
+        self.perms = perms
+
+    def check(self, view, request):
+        cache = get_access_cache(request)
+        cache.prefetch_perms(request.user, self.perms)
+        return cache.has_perms(request.user, self.perms)
+
+
+class InGroup(AccessRule):
+    """
+    Passes if an authenticated user belongs to at least one of the given
+    groups. Superusers always pass, as with `GroupRequiredMixin`.
+    """
+    cost = 3
+
+    def __init__(self, *groups):
+        self.groups = groups
+
+    def check(self, view, request):
+        user = request.user
+        if not user.is_authenticated:
+            return False
+        if user.is_superuser:
+            return True
+        return get_access_cache(request).in_any_group(user, self.groups)
+
+
+class PolicyRequiredMixin(AccessMixin):
+    """
+    View mixin which verifies that the request satisfies an access policy
+    built from `AccessRule` objects, replacing a stack of access mixins with
+    a single check.
+
+    Class Settings
+        `access_policy` - the `AccessRule` to enforce.
+        `login_url` - the login url of site
+        `redirect_field_name` - defaults to "next"
+        `raise_exception` - defaults to False - raise 403 if set to True
+
+    Example Usage
+
+        class SomeView(PolicyRequiredMixin, ListView):
+            access_policy = Authenticated() & (
+                Staff() | InGroup("editors") | HasPerm("blog.change_post"))
+    """
+    access_policy = None
+
+    def get_access_policy(self):
+        """
+        Override this method to customize the access policy.
+        """
+        if not isinstance(self.access_policy, AccessRule):
+            raise ImproperlyConfigured(
+                '{0} requires the "access_policy" attribute to be set to an '
+                'AccessRule.'.format(self.__class__.__name__))
+        return self.access_policy
+
+    def check_access_policy(self, request):
+        return self.get_access_policy().compiled(self, request)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.check_access_policy(request):
+            return self.deny_access(request, 'PolicyRequiredMixin')
+
+        self.audit_access(request, True, 'PolicyRequiredMixin')
+        return super(PolicyRequiredMixin, self).dispatch(
+            request, *args, **kwargs)
+
+
 class SuperuserRequiredMixin(AccessMixin):
     """
     Mixin allows you to require a user with `is_superuser` set to True.
     """
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_superuser:
-            return self.handle_no_permission(request)
+            return self.deny_access(request, 'SuperuserRequiredMixin')
 
+        self.audit_access(request, True, 'SuperuserRequiredMixin')
         return super(SuperuserRequiredMixin, self).dispatch(
             request, *args, **kwargs)
 
@@ -393,8 +1608,9 @@ class StaffuserRequiredMixin(AccessMixin):
     """
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_staff:
-            return self.handle_no_permission(request)
+            return self.deny_access(request, 'StaffuserRequiredMixin')
 
+        self.audit_access(request, True, 'StaffuserRequiredMixin')
         return super(StaffuserRequiredMixin, self).dispatch(
             request, *args, **kwargs)
 
@@ -403,42 +1619,107 @@ class SSLRequiredMixin(object):
     """
     Simple mixin that allows you to force a view to be accessed
     via https.
+
+    Class Settings
+        `raise_exception` - raise 404 instead of redirecting to https
+        `hsts_max_age` - when set, secure responses get a
+            Strict-Transport-Security header with this max-age, in seconds
+        `hsts_include_subdomains` - add includeSubDomains to the header
+        `hsts_preload` - add preload to the header
+        `trust_forwarded_proto` - treat requests with an
+            `X-Forwarded-Proto: https` header as secure
     """
     raise_exception = False  # Default whether to raise an exception to none
+    hsts_max_age = None
+    hsts_include_subdomains = False
+    hsts_preload = False
+    trust_forwarded_proto = False
 
     def dispatch(self, request, *args, **kwargs):
         if getattr(settings, 'DEBUG', False):
             return super(SSLRequiredMixin, self).dispatch(
                 request, *args, **kwargs)
 
-        if not request.is_secure():
+        if not self.is_secure(request):
             if self.raise_exception:
                 raise Http404
 
             return HttpResponsePermanentRedirect(
                 self._build_https_url(request))
 
-        return super(SSLRequiredMixin, self).dispatch(request, *args, **kwargs)
+        response = super(SSLRequiredMixin, self).dispatch(
+            request, *args, **kwargs)
+        hsts_header = self.get_hsts_header()
+        if hsts_header and 'Strict-Transport-Security' not in response:
+            response['Strict-Transport-Security'] = hsts_header
+        return response
+
+    def is_secure(self, request):
+        """
+        Returns whether the request came in over https. Django's
+        `request.is_secure()` already honors `SECURE_PROXY_SSL_HEADER`.
+        """
+        if request.is_secure():
+            return True
+        if self.trust_forwarded_proto:
+            proto = request.META.get('HTTP_X_FORWARDED_PROTO', '')
+            return proto.split(',')[0].strip().lower() == 'https'
+        return False
+
+    def get_hsts_header(self):
+        """
+        Returns the Strict-Transport-Security header value, or None if
+        `hsts_max_age` isn't set.
+        """
+        if self.hsts_max_age is None:
+            return None
+        header = 'max-age={0}'.format(self.hsts_max_age)
+        if self.hsts_include_subdomains:
+            header += '; includeSubDomains'
+        if self.hsts_preload:
+            header += '; preload'
+        return header
 
     def _build_https_url(self, request):
-        """ Get the full url, replace http with https """
-        url = request.build_absolute_uri(request.get_full_path())
-        return re.sub(r'^http', 'https', url)
+        """ Get the full url with the https scheme """
+        return 'https://{0}{1}'.format(
+            request.get_host(), request.get_full_path())
 
 
 class RecentLoginRequiredMixin(LoginRequiredMixin):
     """
     Mixin allows you to require a login to be within a number of seconds.
+
+    Set `check_login_before_dispatch` to True to check the login before the
+    view runs, instead of only checking successful (200) responses after the
+    view has rendered them.
     """
     max_last_login_delta = 1800  # Defaults to 30 minutes
+    check_login_before_dispatch = False
+
+    def is_login_stale(self, user):
+        """
+        Returns whether `user` logged in more than `max_last_login_delta`
+        seconds ago.
+        """
+        if user.last_login is None:
+            return True
+        delta = datetime.timedelta(seconds=self.max_last_login_delta)
+        return now() > (user.last_login + delta)
 
     def dispatch(self, request, *args, **kwargs):
+        if self.check_login_before_dispatch:
+            if (request.user.is_authenticated and
+                    self.is_login_stale(request.user)):
+                return logout_then_login(request, self.get_login_url())
+            return super(RecentLoginRequiredMixin, self).dispatch(
+                request, *args, **kwargs)
+
         resp = super(RecentLoginRequiredMixin, self).dispatch(
             request, *args, **kwargs)
 
         if resp.status_code == 200:
-            delta = datetime.timedelta(seconds=self.max_last_login_delta)
-            if now() > (request.user.last_login + delta):
+            if self.is_login_stale(request.user):
                 return logout_then_login(request, self.get_login_url())
             else:
                 return resp
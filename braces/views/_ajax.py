@@ -1,11 +1,23 @@
 from __future__ import unicode_literals
 
-import json
-from django.core import serializers
+import hashlib
+from itertools import islice
+
+import django
 from django.core.exceptions import ImproperlyConfigured
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.db.models.query import QuerySet
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         StreamingHttpResponse)
 from django.utils import six
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import force_bytes
+from django.utils.http import quote_etag
+
+from ._config import get_class_config
+from ._json import StdlibJSONEngine, get_default_json_engine
+from ._serialization import (VALUES_OPTIONS, ValuesSerializer, serialize,
+                             uses_stock_json_serializer)
 
 
 class JSONResponseMixin(object):
@@ -16,16 +28,26 @@ class JSONResponseMixin(object):
     content_type = None
     json_dumps_kwargs = None
     json_encoder_class = DjangoJSONEncoder
+    json_engine = None
+    json_object_fast_path = True
+    json_etags = False
+    json_stream_chunk_size = 2000
+    json_stream_buffer_size = 64 * 1024
+    ndjson_content_type = 'application/x-ndjson'
 
     def get_content_type(self):
-        if (self.content_type is not None and
-            not isinstance(self.content_type,
+        return get_class_config(self, 'content_type', self.content_type,
+                                self._normalize_content_type)
+
+    def _normalize_content_type(self, content_type):
+        if (content_type is not None and
+            not isinstance(content_type,
                            (six.string_types, six.text_type))):
             raise ImproperlyConfigured(
                 '{0} is missing a content type. Define {0}.content_type, '
                 'or override {0}.get_content_type().'.format(
                     self.__class__.__name__))
-        return self.content_type or "application/json"
+        return content_type or "application/json"
 
     def get_json_dumps_kwargs(self):
         if self.json_dumps_kwargs is None:
@@ -33,26 +55,248 @@ class JSONResponseMixin(object):
         self.json_dumps_kwargs.setdefault('ensure_ascii', False)
         return self.json_dumps_kwargs
 
-    def render_json_response(self, context_dict, status=200):
+    def get_json_engine(self):
+        """
+        Returns the engine encoding and decoding JSON for this view:
+        `json_engine` if set, a `StdlibJSONEngine` if `json_encoder_class`
+        was changed, and the engine from `settings.BRACES_JSON_ENGINE`
+        otherwise.
+        """
+        if self.json_engine is not None:
+            return self.json_engine
+        if self.json_encoder_class is not DjangoJSONEncoder:
+            return get_class_config(self, 'json_encoder_class',
+                                    self.json_encoder_class,
+                                    StdlibJSONEngine)
+        return get_default_json_engine()
+
+    def get_json_etag(self, content=None, version=None):
+        """
+        Returns a strong ETag for a payload: a hash of `version`, a key which
+        changes whenever the payload does, if given, or of `content`, the
+        encoded payload.
+        """
+        data = content if version is None else force_bytes(version)
+        return quote_etag(hashlib.md5(data).hexdigest())
+
+    def get_conditional_json_response(self, etag, status=200):
+        """
+        Returns the answer to a conditional GET or HEAD request for a payload
+        with `etag`, such as a 304 Not Modified, or None if the payload
+        should be sent.
+        """
+        request = getattr(self, 'request', None)
+        if (request is None or request.method not in ('GET', 'HEAD') or
+                not 200 <= status < 300):
+            return None
+        response = get_conditional_response(request, etag=etag)
+        if response is not None and response.status_code == 304:
+            response['ETag'] = etag
+        return response
+
+    def make_json_response(self, encode, status=200, version=None):
+        """
+        Returns an `HttpResponse` of the JSON bytes `encode()` returns.
+
+        Given a `version`, or with `json_etags` set, successful responses get
+        an ETag, and conditional requests matching it are answered with 304
+        Not Modified and no body. A `version` is checked before `encode` is
+        called, so a matching request skips encoding altogether.
+        """
+        etag = None
+        if version is not None:
+            etag = self.get_json_etag(version=version)
+            response = self.get_conditional_json_response(etag, status)
+            if response is not None:
+                return response
+
+        content = encode()
+        if etag is None and self.json_etags:
+            etag = self.get_json_etag(content)
+            response = self.get_conditional_json_response(etag, status)
+            if response is not None:
+                return response
+
+        response = HttpResponse(content,
+                                content_type=self.get_content_type(),
+                                status=status)
+        if etag is not None and 200 <= status < 300:
+            response['ETag'] = etag
+        return response
+
+    def render_json_response(self, context_dict, status=200, version=None):
         """
         Limited serialization for shipping plain data. Do not use for models
         or other complex or custom objects.
         """
-        json_context = json.dumps(
-            context_dict,
-            cls=self.json_encoder_class,
-            **self.get_json_dumps_kwargs()).encode('utf-8')
-        return HttpResponse(json_context,
-                            content_type=self.get_content_type(),
-                            status=status)
+        return self.make_json_response(
+            lambda: self.get_json_engine().dumps(
+                context_dict, **self.get_json_dumps_kwargs()),
+            status, version)
+
+    def iterate_stream_items(self, items):
+        """
+        Iterates over `items`, fetching querysets `json_stream_chunk_size`
+        rows at a time instead of caching every row.
+        """
+        if isinstance(items, QuerySet):
+            if django.VERSION >= (2, 0):
+                return items.iterator(chunk_size=self.json_stream_chunk_size)
+            return items.iterator()
+        return iter(items)
+
+    def iter_json_stream(self, items, ndjson=False):
+        """
+        Encodes `items` one at a time as a JSON array, or as newline
+        delimited JSON, and yields the output in byte strings of about
+        `json_stream_buffer_size` bytes.
+        """
+        kwargs = dict(self.get_json_dumps_kwargs())
+        if ndjson:
+            # Each item has to fit on its own line.
+            kwargs['indent'] = None
+        dumps = self.get_json_engine().dumps
+        buffer_size = self.json_stream_buffer_size
+
+        chunk, size = [], 0
+        separator = b'['
+        for item in self.iterate_stream_items(items):
+            data = dumps(item, **kwargs)
+            if ndjson:
+                chunk.extend((data, b'\n'))
+            else:
+                chunk.extend((separator, data))
+                separator = b', '
+            size += len(data) + 2
+            if size >= buffer_size:
+                yield b''.join(chunk)
+                chunk, size = [], 0
+
+        if not ndjson:
+            chunk.append(b']' if separator == b', ' else b'[]')
+        if chunk:
+            yield b''.join(chunk)
+
+    def make_json_stream_response(self, content, content_type, status=200,
+                                  version=None):
+        """
+        Returns a `StreamingHttpResponse` of `content`, an iterator of
+        bytes. Given a `version`, it gets an ETag, and conditional requests
+        matching it are answered with 304 Not Modified before `content` is
+        read.
+        """
+        etag = None
+        if version is not None:
+            etag = self.get_json_etag(version=version)
+            response = self.get_conditional_json_response(etag, status)
+            if response is not None:
+                return response
+        response = StreamingHttpResponse(
+            content, content_type=content_type, status=status)
+        if etag is not None and 200 <= status < 300:
+            response['ETag'] = etag
+        return response
+
+    def render_json_stream_response(self, items, status=200, ndjson=False,
+                                    version=None):
+        """
+        Streams `items`, an iterable or a queryset of JSON serializable
+        objects such as dicts from `values()`, as a JSON array or as
+        newline delimited JSON, without holding the whole payload in
+        memory.
+        """
+        if ndjson:
+            content_type = self.ndjson_content_type
+        else:
+            content_type = self.get_content_type()
+        return self.make_json_stream_response(
+            self.iter_json_stream(items, ndjson=ndjson), content_type,
+            status, version)
+
+    def use_values_serialization(self, objects, options):
+        """
+        Returns whether `objects` can be serialized from `values_list()`
+        rows instead of model instances: it has to be a queryset,
+        `options` limited to `fields`, `indent`, `ensure_ascii`,
+        `sort_keys` and the natural key options, and the "json" serializer
+        Django's own.
+        """
+        return (self.json_object_fast_path and
+                isinstance(objects, QuerySet) and
+                VALUES_OPTIONS.issuperset(options) and
+                uses_stock_json_serializer())
 
-    def render_json_object_response(self, objects, **kwargs):
+    def iter_json_objects(self, queryset, fields=None,
+                          use_natural_foreign_keys=False,
+                          use_natural_primary_keys=False, **options):
+        """
+        Encodes `queryset` in the format of Django's JSON serializer, reading
+        only the columns it needs with `values_list()`, and yields the output
+        in byte strings of about `json_stream_buffer_size` bytes.
+        """
+        serializer = ValuesSerializer(
+            queryset, fields, use_natural_foreign_keys,
+            use_natural_primary_keys)
+        indent = options.get('indent')
+        if indent:
+            # The serializer's separators, which avoid trailing spaces.
+            options['separators'] = (',', ': ')
+        dumps = self.get_json_engine().dumps
+        buffer_size = self.json_stream_buffer_size
+        batch_size = serializer.get_batch_size(self.json_stream_chunk_size)
+
+        rows = self.iterate_stream_items(serializer.queryset)
+        chunk, size = [b'['], 0
+        separator = b'\n' if indent else b''
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            for obj in serializer.serialize_rows(batch):
+                data = dumps(obj, **options)
+                chunk.extend((separator, data))
+                separator = b',\n' if indent else b', '
+                size += len(data) + 2
+                if size >= buffer_size:
+                    yield b''.join(chunk)
+                    chunk, size = [], 0
+
+        chunk.append(b'\n]\n' if indent else b']')
+        yield b''.join(chunk)
+
+    def iter_json_object_chunks(self, objects, **kwargs):
+        """
+        Yields `objects` encoded in the format of Django's JSON serializer,
+        as byte strings.
+        """
+        if self.use_values_serialization(objects, kwargs):
+            for chunk in self.iter_json_objects(objects, **kwargs):
+                yield chunk
+        else:
+            yield force_bytes(serialize(objects, **kwargs))
+
+    def render_json_object_response(self, objects, version=None, **kwargs):
         """
         Serializes objects using Django's builtin JSON serializer. Additional
         kwargs can be used the same way for django.core.serializers.serialize.
+
+        Querysets are read with `values_list()` and encoded without building
+        model instances; the output has the serializer's format. Related
+        objects are loaded in batches rather than once per object.
+        """
+        return self.make_json_response(
+            lambda: b''.join(self.iter_json_object_chunks(objects, **kwargs)),
+            version=version)
+
+    def render_json_object_stream_response(self, objects, status=200,
+                                           version=None, **kwargs):
+        """
+        Like `render_json_object_response`, but streams querysets read with
+        `values_list()` instead of building the whole payload in memory.
         """
-        json_data = serializers.serialize("json", objects, **kwargs)
-        return HttpResponse(json_data, content_type=self.get_content_type())
+        return self.make_json_stream_response(
+            self.iter_json_object_chunks(objects, **kwargs),
+            self.get_content_type(), status, version)
 
 
 class AjaxResponseMixin(object):
@@ -113,17 +357,14 @@ class JsonRequestResponseMixin(JSONResponseMixin):
     def render_bad_request_response(self, error_dict=None):
         if error_dict is None:
             error_dict = self.error_response_dict
-        json_context = json.dumps(
-            error_dict,
-            cls=self.json_encoder_class,
-            **self.get_json_dumps_kwargs()
-        ).encode('utf-8')
+        json_context = self.get_json_engine().dumps(
+            error_dict, **self.get_json_dumps_kwargs())
         return HttpResponseBadRequest(
             json_context, content_type=self.get_content_type())
 
     def get_request_json(self):
         try:
-            return json.loads(self.request.body.decode('utf-8'))
+            return self.get_json_engine().loads(self.request.body)
         except ValueError:
             return None
 
@@ -0,0 +1,156 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connections
+from django.utils.six.moves import queue
+
+
+logger = logging.getLogger('braces.audit')
+
+_STOP = object()
+
+
+class _Flush(object):
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class ModelAuditSink(object):
+    """
+    Writes audit records to `model` with one `bulk_create` per batch. The
+    model needs a field for each key of the records: `timestamp`,
+    `user_id`, `username`, `view`, `check`, `method`, `path` and `granted`.
+    """
+    def __init__(self, model, batch_size=None):
+        self.model = model
+        self.batch_size = batch_size
+
+    def __call__(self, records):
+        self.model.objects.bulk_create(
+            [self.model(**record) for record in records], self.batch_size)
+
+
+class AccessAuditLog(object):
+    """
+    Buffers access decisions in a bounded queue and hands them to `sink`, a
+    callable taking a list of records, from a background thread. A batch is
+    written once `batch_size` records are waiting or `flush_interval`
+    seconds after the last write, whichever comes first.
+
+    When the queue is full, `record` waits up to `put_timeout` seconds for
+    the writer to catch up and then drops the record, counting it in
+    `dropped`. Whatever is still buffered is written when the process
+    exits.
+    """
+    def __init__(self, sink, batch_size=100, flush_interval=5.0,
+                 max_queue_size=10000, put_timeout=0.1):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run,
+                                          name='braces-audit-log')
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+                atexit.register(self.close)
+
+    def record(self, entry):
+        """
+        Queues `entry`, a dict, to be written. Never raises.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        """
+        Waits until everything queued so far has been written, or for at
+        most `timeout` seconds. Returns whether it was all written.
+        """
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        if deadline is not None:
+            timeout = max(0, deadline - time.time())
+        return marker.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """
+        Writes whatever is buffered and stops the background thread, waiting
+        for at most `timeout` seconds.
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error('Could not stop the access audit log; %d records '
+                         'are still queued.', self._queue.qsize())
+            return
+        if deadline is not None:
+            timeout = max(0, deadline - time.time())
+        thread.join(timeout)
+
+    def _write(self, batch):
+        try:
+            # The thread keeps its own database connections; replace them if
+            # they've gone stale, as Django does between requests.
+            close_old_connections()
+            self.sink(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception('Could not write %d access audit records.',
+                             len(batch))
+
+    def _run(self):
+        batch = []
+        deadline = time.time() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(
+                    timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _Flush):
+                if batch:
+                    self._write(batch)
+                    batch = []
+                item.done.set()
+                continue
+            if item is _STOP:
+                if batch:
+                    self._write(batch)
+                connections.close_all()
+                return
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or time.time() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.time() + self.flush_interval
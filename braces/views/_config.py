@@ -0,0 +1,24 @@
+def get_class_config(view, key, value, normalize):
+    """
+    Returns `normalize(value)`, computing it only once per view class for
+    as long as `value` stays the same object.
+
+    `normalize` validates a configuration value, raising
+    `ImproperlyConfigured` for bad ones, and returns an immutable snapshot
+    that the request path can use without further checks. Assigning a new
+    value to the attribute, on the class or on an instance, triggers a new
+    validation; values should be replaced rather than mutated in place.
+    """
+    cls = view.__class__
+    config = cls.__dict__.get('_braces_config')
+    if config is None:
+        config = {}
+        setattr(cls, '_braces_config', config)
+
+    snapshot = config.get(key)
+    if snapshot is not None and snapshot[0] is value:
+        return snapshot[1]
+
+    normalized = normalize(value)
+    config[key] = (value, normalized)
+    return normalized
@@ -0,0 +1,148 @@
+import json
+import re
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.encoding import force_text
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_django_encoder = DjangoJSONEncoder()
+
+# orjson reads integers outside the 64 bit range as floats.
+_wide_number_bytes = re.compile(br'\d{19}')
+_wide_number_text = re.compile(r'\d{19}')
+
+
+class JSONEngine(object):
+    """
+    Encodes Python objects to UTF-8 JSON bytes and decodes them back.
+
+    `default` is called for objects JSON has no type for. It handles the
+    same Django types as `DjangoJSONEncoder`: dates and times, timedeltas,
+    `Decimal`, `UUID` and lazy strings. Override it to support more.
+    """
+    def default(self, obj):
+        return _django_encoder.default(obj)
+
+    def dumps(self, obj, **kwargs):
+        """
+        Returns `obj` encoded as JSON bytes. `kwargs` are the options
+        `json.dumps` takes.
+        """
+        raise NotImplementedError
+
+    def loads(self, data):
+        """
+        Returns the object encoded in `data`, JSON bytes or text. Raises
+        `ValueError` for invalid JSON.
+        """
+        raise NotImplementedError
+
+
+class StdlibJSONEngine(JSONEngine):
+    """
+    Engine using the standard library's `json` module. A custom
+    `encoder_class` replaces the `default` hook.
+    """
+    def __init__(self, encoder_class=DjangoJSONEncoder):
+        self.encoder_class = encoder_class
+
+    def dumps(self, obj, **kwargs):
+        if self.encoder_class is DjangoJSONEncoder:
+            kwargs.setdefault('default', self.default)
+        return json.dumps(obj, cls=self.encoder_class, **kwargs).encode(
+            'utf-8')
+
+    def loads(self, data):
+        return json.loads(force_text(data))
+
+
+class OrjsonJSONEngine(JSONEngine):
+    """
+    Engine using `orjson`, when it's installed. Django types are encoded
+    through `default`, exactly as `DjangoJSONEncoder` does. The output has
+    no spaces after separators, leaves non-ASCII characters unescaped and,
+    unlike the standard library's, encodes `NaN` and infinities as `null`.
+
+    Anything orjson can't do the same way, such as an explicit
+    `ensure_ascii=True`, an `indent` other than 2, or integers wider than
+    64 bits, is handed to `StdlibJSONEngine`. So is decoding input with
+    wide integers, `NaN` or numbers out of the range of floats.
+    """
+    supported_options = frozenset(['indent', 'sort_keys', 'ensure_ascii',
+                                   'separators'])
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('OrjsonJSONEngine requires orjson.')
+        self.fallback = StdlibJSONEngine()
+        self.fallback.default = self.default
+
+    def get_option(self, kwargs):
+        """
+        Returns the orjson option flags for `kwargs`, or None if orjson
+        can't honor them.
+        """
+        indent = kwargs.get('indent')
+        separators = kwargs.get('separators')
+        if (not self.supported_options.issuperset(kwargs)
+                or indent not in (None, 2)
+                or kwargs.get('ensure_ascii')):
+            return None
+        # orjson's separators are compact, or (',', ': ') when indenting.
+        if separators is not None and tuple(separators) != (
+                (',', ': ') if indent else (',', ':')):
+            return None
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self.get_option(kwargs)
+        if option is None:
+            return self.fallback.dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except orjson.JSONEncodeError:
+            return self.fallback.dumps(obj, **kwargs)
+
+    def loads(self, data):
+        wide_number = (_wide_number_bytes if isinstance(data, bytes)
+                       else _wide_number_text)
+        if wide_number.search(data):
+            return self.fallback.loads(data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # The standard library accepts NaN and Infinity, and decodes
+            # huge numbers to infinities; it raises for anything else.
+            return self.fallback.loads(data)
+
+
+_default_engine = {'setting': None, 'engine': None}
+
+
+def get_default_json_engine():
+    """
+    Returns the engine named by `settings.BRACES_JSON_ENGINE`, a dotted path
+    to an engine class, or `StdlibJSONEngine` without the setting.
+    """
+    setting = getattr(settings, 'BRACES_JSON_ENGINE', None)
+    if (_default_engine['engine'] is None
+            or _default_engine['setting'] != setting):
+        if setting:
+            engine_class = import_string(setting)
+        else:
+            engine_class = StdlibJSONEngine
+        _default_engine['engine'] = engine_class()
+        _default_engine['setting'] = setting
+    return _default_engine['engine']
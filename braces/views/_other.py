@@ -6,6 +6,8 @@ try:
 except ImportError:
     from django.core.urlresolvers import resolve
 
+from ._queries import CachedObjectMixin
+
 
 class SetHeadlineMixin(object):
     """
@@ -60,13 +62,15 @@ class StaticContextMixin(object):
         return self.static_context
 
 
-class CanonicalSlugDetailMixin(object):
+class CanonicalSlugDetailMixin(CachedObjectMixin):
     """
     A mixin that enforces a canonical slug in the url.
 
     If a urlpattern takes a object's pk and slug as arguments and the slug url
     argument does not equal the object's canonical slug, this mixin will
     redirect to the url containing the canonical slug.
+
+    The object is only fetched once, and reused by the view afterwards.
     """
     def dispatch(self, request, *args, **kwargs):
         # Set up since we need to super() later instead of earlier.
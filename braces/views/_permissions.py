@@ -0,0 +1,317 @@
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+
+_permission_stores = weakref.WeakSet()
+
+WILDCARD = '*'
+_TERMINAL = None
+
+
+def is_permission_pattern(perm):
+    """
+    Returns whether `perm` is a wildcard pattern such as "blog.*" or
+    "blog.change_*". Raises `ImproperlyConfigured` for a pattern without an
+    app label, which would never match.
+    """
+    if not perm.endswith(WILDCARD):
+        return False
+    if '.' not in perm:
+        raise ImproperlyConfigured(
+            'The permission pattern "{0}" must start with an app label, '
+            'as in "app_label.{0}".'.format(perm))
+    return True
+
+
+class PermissionIndex(object):
+    """
+    Trie over a set of "app_label.codename" permissions, keyed by app label
+    and then by each character of the codename, so exact and wildcard
+    lookups take time proportional to the permission's length, however many
+    permissions there are.
+    """
+    def __init__(self, perms):
+        self._apps = {}
+        for perm in perms:
+            app_label, _, codename = perm.partition('.')
+            node = self._apps.setdefault(app_label, {})
+            for char in codename:
+                node = node.setdefault(char, {})
+            node[_TERMINAL] = True
+
+    def matches(self, pattern):
+        """
+        Returns whether `pattern` is one of the permissions or, if it ends
+        with "*", the prefix of at least one of them.
+        """
+        prefix = is_permission_pattern(pattern)
+        app_label, _, codename = pattern.partition('.')
+        if prefix:
+            codename = codename[:-1]
+
+        node = self._apps.get(app_label)
+        for char in codename:
+            if node is None:
+                return False
+            node = node.get(char)
+        if node is None:
+            return False
+        return prefix or _TERMINAL in node
+
+
+class PermissionSnapshot(frozenset):
+    """
+    Frozenset of a user's permission names, which compiles its
+    `PermissionIndex` on first use and keeps it for as long as it lives.
+    """
+    @property
+    def index(self):
+        index = self.__dict__.get('_index')
+        if index is None:
+            index = self._index = PermissionIndex(self)
+        return index
+
+    def __reduce__(self):
+        # Don't pickle the index; it's cheaper to rebuild than to transfer.
+        return (self.__class__, (list(self),))
+
+
+class BasePermissionStore(object):
+    """
+    Keeps a snapshot of each user's permissions across requests.
+
+    A snapshot is the set returned by `user.get_all_permissions()`. It is
+    reused until its timeout expires or the user's version changes. Versions
+    change when the user's permissions or groups change, or when any group's
+    permissions change. Every store that exists is invalidated by those
+    changes.
+    """
+    def __init__(self, timeout=300):
+        self.timeout = timeout
+        _permission_stores.add(self)
+
+    def get_snapshot(self, user):
+        """
+        Returns the `PermissionSnapshot` of permission names `user` has,
+        loading it from the auth backends if there's no valid snapshot.
+        """
+        # Taken before loading, so that a change made while the permissions
+        # load leaves the snapshot stale instead of storing it as current.
+        version = self.get_version(user.pk)
+        perms = self.get(user.pk, version)
+        if perms is None:
+            perms = PermissionSnapshot(user.get_all_permissions())
+            self.set(user.pk, perms, version)
+        return perms
+
+    def get_version(self, user_pk):
+        """
+        Returns a token identifying the current version of `user_pk`'s
+        permissions, for `get` and `set`.
+        """
+        raise NotImplementedError
+
+    def get(self, user_pk, version=None):
+        raise NotImplementedError
+
+    def set(self, user_pk, perms, version=None):
+        """
+        Stores `perms` as the snapshot of `user_pk`'s permissions as of
+        `version`, or as of now if it's None.
+        """
+        raise NotImplementedError
+
+    def bump_versions(self, user_pks=None):
+        """
+        Invalidates the snapshots of the users in `user_pks`, or of every
+        user if `user_pks` is None.
+        """
+        raise NotImplementedError
+
+
+class LocalPermissionStore(BasePermissionStore):
+    """
+    Keeps snapshots in a least-recently-used dict local to the process.
+    Changes made by other processes are only seen once `timeout` expires.
+
+    Versions are numbers from a counter bumped on every change. The last
+    change of at most `max_entries` users is remembered; forgetting an older
+    one invalidates every snapshot taken before it.
+    """
+    def __init__(self, max_entries=1000, timeout=300):
+        super(LocalPermissionStore, self).__init__(timeout)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._changes = OrderedDict()
+        self._counter = 0
+        self._oldest_valid = 0
+        self._lock = threading.Lock()
+
+    def _is_current(self, user_pk, version):
+        return version >= max(self._oldest_valid,
+                              self._changes.get(user_pk, 0))
+
+    def get_version(self, user_pk):
+        return self._counter
+
+    def get(self, user_pk, version=None):
+        with self._lock:
+            entry = self._entries.pop(user_pk, None)
+            if entry is None:
+                return None
+            version, expires, perms = entry
+            if (not self._is_current(user_pk, version) or
+                    expires <= time.time()):
+                return None
+            self._entries[user_pk] = entry
+            return perms
+
+    def set(self, user_pk, perms, version=None):
+        with self._lock:
+            if version is None:
+                version = self._counter
+            self._entries.pop(user_pk, None)
+            if not self._is_current(user_pk, version):
+                return
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+            self._entries[user_pk] = (
+                version, time.time() + self.timeout, perms)
+
+    def bump_versions(self, user_pks=None):
+        with self._lock:
+            self._counter += 1
+            if user_pks is None:
+                self._oldest_valid = self._counter
+                self._changes.clear()
+                return
+            for pk in user_pks:
+                self._changes.pop(pk, None)
+                self._changes[pk] = self._counter
+            while len(self._changes) > self.max_entries:
+                pk, version = self._changes.popitem(last=False)
+                self._oldest_valid = max(self._oldest_valid, version)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CachePermissionStore(BasePermissionStore):
+    """
+    Keeps snapshots and versions in one of Django's caches, so every process
+    using that cache shares them.
+    """
+    version_key = 'braces:perms:version'
+    user_version_key = 'braces:perms:version:{0}'
+
+    def __init__(self, alias='default', timeout=300):
+        super(CachePermissionStore, self).__init__(timeout)
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, user_pk):
+        keys = [self.version_key, self.user_version_key.format(user_pk)]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                self.cache.add(key, uuid.uuid4().hex, None)
+                versions[key] = self.cache.get(key)
+        return 'braces:perms:{0}:{1}:{2}'.format(
+            user_pk, versions[keys[0]], versions[keys[1]])
+
+    def get_version(self, user_pk):
+        return self._key(user_pk)
+
+    def get(self, user_pk, version=None):
+        return self.cache.get(version or self._key(user_pk))
+
+    def set(self, user_pk, perms, version=None):
+        self.cache.set(version or self._key(user_pk), perms, self.timeout)
+
+    def bump_versions(self, user_pks=None):
+        _bump_cache_versions(self.cache, self.version_key,
+                             self.user_version_key, user_pks)
+
+
+def _bump_cache_versions(cache, version_key, user_version_key, user_pks):
+    if user_pks is None:
+        keys = [version_key]
+    else:
+        keys = [user_version_key.format(pk) for pk in user_pks]
+    cache.set_many(dict((key, uuid.uuid4().hex) for key in keys), None)
+
+
+def bump_permission_versions(user_pks=None):
+    """
+    Invalidates the permission snapshots of the users in `user_pks`, or of
+    every user if `user_pks` is None, in every permission store of this
+    process and in the cache named by `settings.BRACES_PERMISSION_CACHE`.
+
+    The setting lets processes that never create a `CachePermissionStore`,
+    such as task workers, invalidate the snapshots other processes share.
+    """
+    aliases = set()
+    for store in list(_permission_stores):
+        store.bump_versions(user_pks)
+        if isinstance(store, CachePermissionStore):
+            aliases.add(store.alias)
+
+    alias = getattr(settings, 'BRACES_PERMISSION_CACHE', None)
+    if alias and alias not in aliases:
+        _bump_cache_versions(
+            caches[alias], CachePermissionStore.version_key,
+            CachePermissionStore.user_version_key, user_pks)
+
+
+@receiver(m2m_changed)
+def _permissions_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    user_model = get_user_model()
+    user_relations = [getattr(user_model, name, None)
+                      for name in ('user_permissions', 'groups')]
+    if sender in [getattr(rel, 'through', None) for rel in user_relations]:
+        if not reverse:
+            bump_permission_versions([instance.pk])
+        elif pk_set:
+            bump_permission_versions(pk_set)
+        else:
+            bump_permission_versions()
+    elif sender is Group.permissions.through:
+        bump_permission_versions()
+
+
+@receiver(post_save)
+def _user_saved(sender, instance, created=False, update_fields=None,
+                **kwargs):
+    if sender is not get_user_model() or created:
+        return
+    # Logging in saves last_login only, which doesn't affect permissions.
+    if update_fields and set(update_fields) == set(['last_login']):
+        return
+    bump_permission_versions([instance.pk])
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(post_delete, sender=Group)
+def _permission_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        bump_permission_versions()
@@ -2,6 +2,8 @@ import warnings
 
 from django.core.exceptions import ImproperlyConfigured
 
+from ._config import get_class_config
+
 
 class SelectRelatedMixin(object):
     """
@@ -11,27 +13,34 @@ class SelectRelatedMixin(object):
     select_related = None  # Default related fields to none
 
     def get_queryset(self):
-        if self.select_related is None:
+        select_related = get_class_config(
+            self, 'select_related', self.select_related,
+            self._normalize_select_related)
+
+        # Get the current queryset of the view
+        queryset = super(SelectRelatedMixin, self).get_queryset()
+
+        if not select_related:
+            warnings.warn('The select_related attribute is empty')
+            return queryset
+
+        return queryset.select_related(*select_related)
+
+    def _normalize_select_related(self, select_related):
+        if select_related is None:
             # If no fields were provided, raise a configuration error
             raise ImproperlyConfigured(
                 '{0} is missing the select_related property. This must be '
                 'a tuple or list.'.format(self.__class__.__name__))
 
-        if not isinstance(self.select_related, (tuple, list)):
+        if not isinstance(select_related, (tuple, list)):
             # If the select_related argument is *not* a tuple or list,
             # raise a configuration error.
             raise ImproperlyConfigured(
                 "{0}'s select_related property must be a tuple or "
                 "list.".format(self.__class__.__name__))
 
-        # Get the current queryset of the view
-        queryset = super(SelectRelatedMixin, self).get_queryset()
-
-        if not self.select_related:
-            warnings.warn('The select_related attribute is empty')
-            return queryset
-
-        return queryset.select_related(*self.select_related)
+        return tuple(select_related)
 
 
 class PrefetchRelatedMixin(object):
@@ -42,27 +51,58 @@ class PrefetchRelatedMixin(object):
     prefetch_related = None  # Default prefetch fields to none
 
     def get_queryset(self):
-        if self.prefetch_related is None:
+        prefetch_related = get_class_config(
+            self, 'prefetch_related', self.prefetch_related,
+            self._normalize_prefetch_related)
+
+        # Get the current queryset of the view
+        queryset = super(PrefetchRelatedMixin, self).get_queryset()
+
+        if not prefetch_related:
+            warnings.warn('The prefetch_related attribute is empty')
+            return queryset
+
+        return queryset.prefetch_related(*prefetch_related)
+
+    def _normalize_prefetch_related(self, prefetch_related):
+        if prefetch_related is None:
             # If no fields were provided, raise a configuration error
             raise ImproperlyConfigured(
                 '{0} is missing the prefetch_related property. This must be '
                 'a tuple or list.'.format(self.__class__.__name__))
 
-        if not isinstance(self.prefetch_related, (tuple, list)):
+        if not isinstance(prefetch_related, (tuple, list)):
             # If the prefetch_related argument is *not* a tuple or list,
             # raise a configuration error.
             raise ImproperlyConfigured(
                 "{0}'s prefetch_related property must be a tuple or "
                 "list.".format(self.__class__.__name__))
 
-        # Get the current queryset of the view
-        queryset = super(PrefetchRelatedMixin, self).get_queryset()
+        return tuple(prefetch_related)
 
-        if not self.prefetch_related:
-            warnings.warn('The prefetch_related attribute is empty')
-            return queryset
 
-        return queryset.prefetch_related(*self.prefetch_related)
+class CachedObjectMixin(object):
+    """
+    Mixin that fetches the view's object only once per request, however
+    many times `get_object()` is called by the view and other mixins.
+
+    Call `invalidate_object()` after changing the object in a way that
+    requires fetching it again.
+    """
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super(CachedObjectMixin, self).get_object(queryset)
+
+        if '_cached_object' not in self.__dict__:
+            self._cached_object = super(CachedObjectMixin, self).get_object()
+        return self._cached_object
+
+    def invalidate_object(self):
+        """
+        Drop the cached object so the next `get_object()` call fetches it
+        again.
+        """
+        self.__dict__.pop('_cached_object', None)
 
 
 class OrderableListMixin(object):
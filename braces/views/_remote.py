@@ -0,0 +1,309 @@
+import errno
+import json
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.six.moves import http_client, queue
+from django.utils.six.moves.urllib.parse import urlsplit
+
+
+class CircuitBreaker(object):
+    """
+    Stops calls to a failing service. After `failure_threshold` failures in
+    a row the circuit opens and `allow()` returns False. Once
+    `reset_timeout` seconds have passed, a single trial call is let through;
+    its success closes the circuit again, its failure keeps it open for
+    another `reset_timeout`.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.time()
+            if now - self.opened_at >= self.reset_timeout:
+                # Let this call through as the trial and hold the others
+                # back until it reports.
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+
+
+# Errors meaning the server closed a kept-alive connection.
+_RESET_ERRNOS = frozenset([errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE])
+
+
+def _is_connection_reset(exc):
+    """
+    Returns whether `exc` shows that the server closed the connection
+    before answering, as opposed to not answering in time.
+    """
+    if isinstance(exc, socket.timeout):
+        return False
+    # Includes RemoteDisconnected, a closed connection on Python 3.
+    if isinstance(exc, http_client.BadStatusLine):
+        return True
+    return getattr(exc, 'errno', None) in _RESET_ERRNOS
+
+
+class ConnectionPool(object):
+    """
+    Keeps up to `size` persistent HTTP connections to the host of `url`
+    for reuse between calls.
+    """
+    def __init__(self, url, timeout=2.0, size=4):
+        parts = urlsplit(url)
+        if parts.scheme == 'https':
+            self.connection_class = http_client.HTTPSConnection
+        else:
+            self.connection_class = http_client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += '?' + parts.query
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(size)
+
+    def _connect(self):
+        return self.connection_class(self.host, self.port,
+                                     timeout=self.timeout)
+
+    def post(self, body, headers):
+        """
+        POSTs `body` and returns `(status, data)`. A pooled connection the
+        server has closed in the meantime is replaced and the request sent
+        once more. Other errors, such as timeouts, are raised.
+        """
+        try:
+            connection, reused = self._pool.get_nowait(), True
+        except queue.Empty:
+            connection, reused = self._connect(), False
+
+        while True:
+            try:
+                connection.request('POST', self.path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (socket.error, http_client.HTTPException) as exc:
+                connection.close()
+                if not reused or not _is_connection_reset(exc):
+                    raise
+                connection, reused = self._connect(), False
+            else:
+                break
+
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+        return response.status, data
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class PolicyDecisionClient(object):
+    """
+    Asks a remote policy decision point whether a subject may perform
+    actions on a resource.
+
+    The decision point receives a JSON POST of
+    `{"subject": {...}, "resource": {...} or null, "actions": [...]}` and
+    answers `{"decisions": {"<action>": true|false, ...}}`. Actions it
+    leaves out are denied.
+
+    Decisions are cached for `cache_timeout` seconds. When the decision
+    point fails or the circuit breaker is open, every action is allowed if
+    `fail_open` is True and denied otherwise; those answers aren't cached.
+    """
+    max_entries = 10000
+
+    def __init__(self, url, timeout=2.0, cache_timeout=60, fail_open=False,
+                 failure_threshold=5, reset_timeout=30, pool_size=4):
+        self.pool = ConnectionPool(url, timeout, pool_size)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.cache_timeout = cache_timeout
+        self.fail_open = fail_open
+        self._decisions = {}
+        self._lock = threading.Lock()
+
+    def _key(self, subject, resource, action):
+        resource = resource or {}
+        return (subject.get('id'), resource.get('type'), resource.get('id'),
+                action)
+
+    def _get_cached(self, keys, now):
+        decisions = {}
+        with self._lock:
+            for key in keys:
+                decision, expires = self._decisions.get(key, (None, 0))
+                if expires > now:
+                    decisions[key[-1]] = decision
+        return decisions
+
+    def _set_cached(self, decisions, now):
+        expires = now + self.cache_timeout
+        with self._lock:
+            if len(self._decisions) + len(decisions) > self.max_entries:
+                self._cull(now)
+            for key, decision in decisions.items():
+                self._decisions[key] = (decision, expires)
+
+    def _cull(self, now):
+        expired = [key for key, (decision, expires)
+                   in self._decisions.items() if expires <= now]
+        for key in expired:
+            del self._decisions[key]
+        if len(self._decisions) >= self.max_entries:
+            self._decisions.clear()
+
+    def clear(self):
+        with self._lock:
+            self._decisions.clear()
+
+    def request_decisions(self, subject, actions, resource=None):
+        """
+        Asks the decision point about `actions` in one call and returns a
+        dict of action to decision. Raises `ValueError` on a bad answer,
+        and `socket.error` or `HTTPException` when it can't be reached.
+        """
+        body = json.dumps({
+            'subject': subject,
+            'resource': resource,
+            'actions': list(actions),
+        })
+        status, data = self.pool.post(body, {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        })
+        if status != 200:
+            raise ValueError(
+                'Policy decision point answered {0}.'.format(status))
+        decisions = json.loads(data.decode('utf-8'))['decisions']
+        return dict((action, decisions.get(action) is True)
+                    for action in actions)
+
+    def decide(self, subject, actions, resource=None):
+        """
+        Returns a dict of each of `actions` to whether `subject` may perform
+        it on `resource`, asking the decision point at most once for the
+        actions that aren't cached.
+        """
+        now = time.time()
+        keys = [self._key(subject, resource, action) for action in actions]
+        decisions = self._get_cached(keys, now)
+        missing = [action for action in actions if action not in decisions]
+        if not missing:
+            return decisions
+
+        if not self.breaker.allow():
+            decisions.update((action, self.fail_open) for action in missing)
+            return decisions
+
+        try:
+            answered = self.request_decisions(subject, missing, resource)
+        except (socket.error, http_client.HTTPException, ValueError,
+                KeyError, TypeError, AttributeError):
+            self.breaker.record_failure()
+            decisions.update((action, self.fail_open) for action in missing)
+            return decisions
+
+        self.breaker.record_success()
+        self._set_cached(dict(
+            (self._key(subject, resource, action), decision)
+            for action, decision in answered.items()), now)
+        decisions.update(answered)
+        return decisions
+
+
+_policy_client = {'config': None, 'client': None}
+_policy_client_lock = threading.Lock()
+
+
+def get_policy_client():
+    """
+    Returns the `PolicyDecisionClient` configured by
+    `settings.BRACES_POLICY_DECISION_POINT`, a dict with a "URL" and,
+    optionally, "TIMEOUT", "CACHE_TIMEOUT", "FAIL_OPEN",
+    "FAILURE_THRESHOLD", "RESET_TIMEOUT" and "POOL_SIZE". The client is
+    shared, so its connections, cache and circuit breaker outlive requests.
+    """
+    config = getattr(settings, 'BRACES_POLICY_DECISION_POINT', None)
+    if not config or 'URL' not in config:
+        raise ImproperlyConfigured(
+            'RemotePolicyBackend requires the BRACES_POLICY_DECISION_POINT '
+            'setting to be a dict with a "URL".')
+    with _policy_client_lock:
+        if _policy_client['config'] is not config:
+            if _policy_client['client'] is not None:
+                _policy_client['client'].pool.close()
+            options = dict((key.lower(), value)
+                           for key, value in config.items() if key != 'URL')
+            _policy_client['client'] = PolicyDecisionClient(
+                config['URL'], **options)
+            _policy_client['config'] = config
+        return _policy_client['client']
+
+
+class RemotePolicyBackend(object):
+    """
+    Authentication backend which answers permission checks by asking the
+    policy decision point configured in
+    `settings.BRACES_POLICY_DECISION_POINT`. It never authenticates users.
+
+    It implements `has_perms_batch`, so the access mixins put every
+    permission they need in a single call to it. List it after a backend
+    that authenticates users, such as `ModelBackend`.
+    """
+    def authenticate(self, request, **credentials):
+        return None
+
+    def get_subject(self, user_obj):
+        return {'id': user_obj.pk, 'username': user_obj.get_username()}
+
+    def get_resource(self, obj):
+        if obj is None:
+            return None
+        meta = getattr(obj, '_meta', None)
+        resource_type = (meta.label_lower if meta is not None
+                         else obj.__class__.__name__.lower())
+        return {'type': resource_type, 'id': str(getattr(obj, 'pk', obj))}
+
+    def has_perms_batch(self, user_obj, perm_list, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous:
+            return set()
+        decisions = get_policy_client().decide(
+            self.get_subject(user_obj), perm_list, self.get_resource(obj))
+        return set(perm for perm, allowed in decisions.items() if allowed)
+
+    def has_perm(self, user_obj, perm, obj=None):
+        return perm in self.has_perms_batch(user_obj, [perm], obj)
@@ -0,0 +1,279 @@
+from collections import OrderedDict
+
+from django.core import serializers
+from django.core.serializers.json import Serializer as JSONSerializer
+from django.db import connections
+from django.db.models import Model, prefetch_related_objects
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_text, is_protected_type
+
+
+# Options of `serializers.serialize("json", ...)` the values path supports.
+VALUES_OPTIONS = frozenset(['fields', 'indent', 'ensure_ascii', 'sort_keys',
+                            'use_natural_foreign_keys',
+                            'use_natural_primary_keys'])
+
+
+class _Values(object):
+    """
+    Stands in for a model instance when a field converts a value read by
+    `values_list()` with `value_to_string()`.
+    """
+
+
+def get_value_converter(field):
+    """
+    Returns a function converting values of `field` the way Django's
+    serializers do: protected types such as `None`, numbers, dates and
+    `Decimal` are kept, everything else goes through `value_to_string()`.
+    """
+    holder = _Values()
+    attname = field.attname
+    value_to_string = field.value_to_string
+
+    def convert(value):
+        if is_protected_type(value):
+            return value
+        holder.__dict__[attname] = value
+        return value_to_string(holder)
+    return convert
+
+
+def get_serialized_fields(model, selected_fields=None):
+    """
+    Returns the local fields and the many-to-many fields of `model` that
+    Django's serializers output, limited to `selected_fields` if given.
+    """
+    opts = model._meta.concrete_model._meta
+    local_fields = [
+        field for field in opts.local_fields
+        if field.serialize and (
+            selected_fields is None or
+            (field.attname if field.remote_field is None
+             else field.attname[:-3]) in selected_fields)]
+    many_to_many = [
+        field for field in opts.many_to_many
+        if field.serialize and field.remote_field.through._meta.auto_created
+        and (selected_fields is None or field.attname in selected_fields)]
+    return local_fields, many_to_many
+
+
+def has_natural_key(model):
+    return hasattr(model, 'natural_key')
+
+
+def get_natural_key_relations(model):
+    """
+    Returns the names of the foreign keys of `model` that its
+    `natural_key()` follows, going by the models listed in
+    `natural_key.dependencies`.
+    """
+    dependencies = set(
+        label.lower()
+        for label in getattr(model.natural_key, 'dependencies', ()))
+    return [field.name for field in model._meta.concrete_model._meta.fields
+            if field.remote_field is not None and
+            field.remote_field.model._meta.label_lower in dependencies]
+
+
+def get_natural_keys(model, field, values, using):
+    """
+    Returns a dict of each of `values` of `field`, a field of `model`, to
+    the natural key of the object having it, loaded in one query.
+    """
+    if not values:
+        return {}
+    objects = model._default_manager.db_manager(using).select_related(
+        *get_natural_key_relations(model)).filter(
+        **{'{0}__in'.format(field.attname): values})
+    return dict((getattr(obj, field.attname), obj.natural_key())
+                for obj in objects)
+
+
+def get_prefetch_lookups(model, selected_fields=None,
+                         use_natural_foreign_keys=False):
+    """
+    Returns the `prefetch_related()` lookups loading everything Django's
+    serializer reads from the related objects of `model` instances.
+    """
+    local_fields, many_to_many = get_serialized_fields(
+        model, selected_fields)
+    related_fields = many_to_many[:]
+    if use_natural_foreign_keys:
+        related_fields.extend(
+            field for field in local_fields
+            if field.remote_field is not None and
+            has_natural_key(field.remote_field.model))
+
+    lookups = []
+    for field in related_fields:
+        related_model = field.remote_field.model
+        lookups.append(field.name)
+        if use_natural_foreign_keys and has_natural_key(related_model):
+            lookups.extend('{0}__{1}'.format(field.name, name)
+                           for name in get_natural_key_relations(
+                               related_model))
+    return lookups
+
+
+def uses_stock_json_serializer():
+    """
+    Returns whether the "json" serializer is Django's, rather than one
+    registered in `settings.SERIALIZATION_MODULES`.
+    """
+    return serializers.get_serializer('json') is JSONSerializer
+
+
+class PrefetchedSerializer(JSONSerializer):
+    """
+    Django's JSON serializer, reading many-to-many values from prefetched
+    objects, when there are some, instead of querying for each object.
+    """
+    def handle_m2m_field(self, obj, field):
+        prefetched = getattr(obj, '_prefetched_objects_cache', {})
+        if (field.name not in prefetched or
+                not field.remote_field.through._meta.auto_created):
+            return super(PrefetchedSerializer, self).handle_m2m_field(
+                obj, field)
+
+        related = getattr(obj, field.name).all()
+        if (self.use_natural_foreign_keys and
+                has_natural_key(field.remote_field.model)):
+            values = [value.natural_key() for value in related]
+        else:
+            convert = get_value_converter(field.remote_field.model._meta.pk)
+            values = [convert(value.pk) for value in related]
+        self._current[field.name] = values
+
+
+def serialize(objects, **options):
+    """
+    Serializes `objects`, a queryset or a list of instances of one model,
+    with Django's JSON serializer, prefetching the related objects it reads
+    so that each relation costs a fixed number of queries.
+
+    A "json" serializer registered in `settings.SERIALIZATION_MODULES` is
+    used as it is.
+    """
+    if not uses_stock_json_serializer():
+        return serializers.serialize('json', objects, **options)
+    if isinstance(objects, QuerySet):
+        model = objects.model
+    else:
+        objects = list(objects)
+        models = set(obj.__class__ for obj in objects)
+        model = models.pop() if len(models) == 1 else None
+    if model is None or not issubclass(model, Model):
+        return PrefetchedSerializer().serialize(objects, **options)
+
+    lookups = get_prefetch_lookups(
+        model, options.get('fields'),
+        options.get('use_natural_foreign_keys', False))
+    if lookups:
+        if isinstance(objects, QuerySet):
+            objects = objects.prefetch_related(*lookups)
+        else:
+            prefetch_related_objects(objects, *lookups)
+    return PrefetchedSerializer().serialize(objects, **options)
+
+
+class ValuesSerializer(object):
+    """
+    Builds the objects Django's JSON serializer outputs for a queryset,
+    `{"model": ..., "pk": ..., "fields": {...}}`, from the columns it needs
+    read with `values_list()`, without creating model instances.
+
+    Many-to-many fields, and natural keys of related objects, take one
+    query per field for each batch of rows, instead of one per object.
+    """
+    def __init__(self, queryset, fields=None, use_natural_foreign_keys=False,
+                 use_natural_primary_keys=False):
+        model = queryset.model
+        self.label = force_text(model._meta)
+        self.use_natural_foreign_keys = use_natural_foreign_keys
+        self.include_pk = not (use_natural_primary_keys and
+                               has_natural_key(model))
+        local_fields, self.many_to_many = get_serialized_fields(
+            model, fields)
+        pk = model._meta.pk
+        self.names = [field.name for field in local_fields]
+        self.converters = [get_value_converter(field)
+                           for field in [pk] + local_fields]
+        self.natural_foreign_keys = [
+            (index, field)
+            for index, field in enumerate(local_fields, start=1)
+            if use_natural_foreign_keys and field.remote_field is not None
+            and has_natural_key(field.remote_field.model)]
+        self.queryset = queryset.prefetch_related(None).values_list(
+            pk.attname, *[field.attname for field in local_fields])
+
+    def get_batch_size(self, batch_size):
+        """
+        Limits `batch_size` to the number of query parameters the database
+        accepts, when there are related objects to look up.
+        """
+        if not self.many_to_many and not self.natural_foreign_keys:
+            return batch_size
+        features = connections[self.queryset.db].features
+        max_params = getattr(features, 'max_query_params', None)
+        return min(batch_size, max_params or batch_size)
+
+    def get_related_values(self, field, pks):
+        """
+        Returns a dict of each of `pks` to the converted primary keys, or the
+        natural keys, of its related objects through `field`.
+        """
+        related_model = field.remote_field.model
+        related_pk = related_model._meta.pk
+        query_name = field.related_query_name()
+        pairs = related_model._default_manager.db_manager(
+            self.queryset.db).filter(
+            **{'{0}__in'.format(query_name): pks}).values_list(
+            query_name, 'pk')
+
+        if self.use_natural_foreign_keys and has_natural_key(related_model):
+            pairs = list(pairs)
+            natural_keys = get_natural_keys(
+                related_model, related_pk,
+                set(value for pk, value in pairs), self.queryset.db)
+            convert = natural_keys.get
+        else:
+            convert = get_value_converter(related_pk)
+
+        values = {}
+        for pk, value in pairs:
+            values.setdefault(pk, []).append(convert(value))
+        return values
+
+    def serialize_rows(self, rows):
+        """
+        Returns the serializer's objects for `rows`, a list read from
+        `queryset`.
+        """
+        related = [
+            (field.name, self.get_related_values(
+                field, [row[0] for row in rows]))
+            for field in self.many_to_many]
+        natural_keys = [
+            (index, get_natural_keys(
+                field.remote_field.model, field.target_field,
+                set(row[index] for row in rows) - set([None]),
+                self.queryset.db))
+            for index, field in self.natural_foreign_keys]
+
+        label, names, converters = self.label, self.names, self.converters
+        objects = []
+        for row in rows:
+            values = [convert(value)
+                      for convert, value in zip(converters, row)]
+            for index, keys in natural_keys:
+                values[index] = keys.get(row[index])
+            fields = OrderedDict(zip(names, values[1:]))
+            for name, values_by_pk in related:
+                fields[name] = values_by_pk.get(row[0], [])
+            obj = OrderedDict([('model', label)])
+            if self.include_pk:
+                obj['pk'] = values[0]
+            obj['fields'] = fields
+            objects.append(obj)
+        return objects
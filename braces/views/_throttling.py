@@ -0,0 +1,240 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils import six
+
+from ._access import AccessMixin, _user_is_loaded
+from ._config import get_class_config
+
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def token_bucket(state, limit, period, now):
+    """
+    Token bucket holding up to `limit` tokens, refilled at `limit` tokens
+    per `period` seconds. Each request takes one token.
+
+    Returns `(allowed, new_state)`.
+    """
+    if state is None:
+        tokens = float(limit)
+    else:
+        tokens, stamp = state
+        tokens = min(float(limit), tokens + (now - stamp) * limit / period)
+
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    return allowed, (tokens, now)
+
+
+def sliding_window(state, limit, period, now):
+    """
+    Sliding window counter allowing `limit` requests in any `period`
+    seconds. The previous fixed window's count is weighted by how much of
+    it still overlaps the sliding window.
+
+    Returns `(allowed, new_state)`.
+    """
+    window = int(now // period)
+    count = previous = 0
+    if state is not None:
+        last_window, last_count, last_previous = state
+        if last_window == window:
+            count, previous = last_count, last_previous
+        elif last_window == window - 1:
+            previous = last_count
+
+    weight = 1 - (now - window * period) / float(period)
+    allowed = previous * weight + count < limit
+    if allowed:
+        count += 1
+    return allowed, (window, count, previous)
+
+
+RATE_LIMIT_ALGORITHMS = {
+    'token_bucket': token_bucket,
+    'sliding_window': sliding_window,
+}
+
+
+class InMemoryRateLimitStore(object):
+    """
+    Keeps rate limit state in a dict local to the process. Each process
+    enforces its own limits. When `max_entries` keys are stored, the least
+    recently updated ones are evicted.
+    """
+    max_entries = 10000
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, key, func, timeout):
+        """
+        Atomically replaces the state under `key` with `func(state)[1]`
+        and returns `func(state)[0]`. The state expires after `timeout`
+        seconds.
+        """
+        now = time.time()
+        with self._lock:
+            # Popped and set again to move the key to the end.
+            state, expires = self._data.pop(key, (None, 0))
+            if expires <= now:
+                state = None
+            result, state = func(state)
+            while len(self._data) >= self.max_entries:
+                self._data.popitem(last=False)
+            self._data[key] = (state, now + timeout)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CacheRateLimitStore(object):
+    """
+    Keeps rate limit state in one of Django's caches, so limits are shared
+    by every process using that cache. Updates are not atomic; concurrent
+    requests may occasionally get past the limit.
+    """
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def update(self, key, func, timeout):
+        cache = caches[self.alias]
+        result, state = func(cache.get(key))
+        cache.set(key, state, timeout)
+        return result
+
+
+default_rate_limit_store = InMemoryRateLimitStore()
+
+
+def rate_limited_response(request):
+    return HttpResponse('Too Many Requests', status=429)
+
+
+class RateLimitMixin(AccessMixin):
+    """
+    View mixin which rejects requests over a rate limit before the view
+    runs, with `rate_limit_exceeded()`. That's a "429 Too Many Requests"
+    response, unless the view sets `raise_exception`, in which case it
+    goes through `handle_no_permission` as with the other access mixins.
+
+    Class Settings
+        `rate_limit` - "<number>/<s|m|h|d>" or a `(number, seconds)` tuple.
+        `rate_limit_key` - "user" or "ip". "user" falls back to the IP
+            address for anonymous requests. Define it as a method taking
+            the request and returning a string to count by anything else.
+        `rate_limit_algorithm` - "token_bucket" or "sliding_window".
+        `rate_limit_store` - where state is kept. Defaults to a store
+            local to the process; use `CacheRateLimitStore` to share it.
+
+    Example Usage
+
+        class ExportView(RateLimitMixin, View):
+            rate_limit = "10/m"
+            rate_limit_key = "user"
+    """
+    rate_limit = None
+    rate_limit_key = 'user'
+    rate_limit_algorithm = 'token_bucket'
+    rate_limit_store = None
+
+    def get_rate_limit(self):
+        """
+        Returns the rate limit as a `(number, seconds)` tuple.
+        """
+        return get_class_config(self, 'rate_limit', self.rate_limit,
+                                self._normalize_rate_limit)
+
+    def _normalize_rate_limit(self, rate_limit):
+        try:
+            if isinstance(rate_limit, six.string_types):
+                number, period = rate_limit.split('/')
+                limit, period = int(number), RATE_PERIODS[period[0]]
+            else:
+                limit, period = rate_limit
+            if limit <= 0 or period <= 0:
+                raise ValueError
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+            raise ImproperlyConfigured(
+                '{0} requires the "rate_limit" attribute to be set as '
+                '"<number>/<s|m|h|d>" or a (number, seconds) tuple.'.format(
+                    self.__class__.__name__))
+        return limit, period
+
+    def get_rate_limit_algorithm(self):
+        try:
+            return RATE_LIMIT_ALGORITHMS[self.rate_limit_algorithm]
+        except KeyError:
+            raise ImproperlyConfigured(
+                '{0}.rate_limit_algorithm must be "token_bucket" or '
+                '"sliding_window".'.format(self.__class__.__name__))
+
+    def get_rate_limit_store(self):
+        return self.rate_limit_store or default_rate_limit_store
+
+    def get_rate_limit_ident(self, request):
+        """
+        Returns the string identifying whose requests are counted.
+
+        "user" never loads the user. Unless `request.user` is already
+        loaded, the user id is read from the session, which costs a query
+        with the database session backend. Requests without a session
+        cookie are counted by IP address without reading the session.
+        """
+        if callable(self.rate_limit_key):
+            return self.rate_limit_key(request)
+        if self.rate_limit_key == 'user':
+            user_id = None
+            user = getattr(request, 'user', None)
+            session = getattr(request, 'session', None)
+            if user is not None and _user_is_loaded(user):
+                user_id = user.pk if user.is_authenticated else None
+            elif (session is not None and
+                    settings.SESSION_COOKIE_NAME in request.COOKIES):
+                user_id = session.get(SESSION_KEY)
+            if user_id is not None:
+                return 'user:{0}'.format(user_id)
+        return 'ip:{0}'.format(request.META.get('REMOTE_ADDR', ''))
+
+    def check_rate_limit(self, request):
+        """
+        Counts this request and returns whether it is within the limit.
+        """
+        limit, period = self.get_rate_limit()
+        algorithm = self.get_rate_limit_algorithm()
+        key = 'braces:ratelimit:{0}.{1}:{2}'.format(
+            self.__class__.__module__, self.__class__.__name__,
+            self.get_rate_limit_ident(request))
+        now = time.time()
+        return self.get_rate_limit_store().update(
+            key, lambda state: algorithm(state, limit, period, now),
+            period * 2)
+
+    def rate_limit_exceeded(self, request):
+        """
+        Returns the response to a request over the limit: a 429 response,
+        or `handle_no_permission()`'s if the view sets `raise_exception`.
+        """
+        if self.raise_exception:
+            return self.deny_access(request, 'RateLimitMixin')
+        self.audit_access(request, False, 'RateLimitMixin')
+        return rate_limited_response(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.check_rate_limit(request):
+            return self.rate_limit_exceeded(request)
+
+        return super(RateLimitMixin, self).dispatch(
+            request, *args, **kwargs)
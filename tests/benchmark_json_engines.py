@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the JSON engines on representative payloads.
+
+Run from the repository root with:
+
+    python -m tests.benchmark_json_engines [--number N]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import datetime
+import decimal
+import os
+import timeit
+import uuid
+
+import django
+from django.conf import settings
+
+if not settings.configured:
+    from tests import settings as test_settings
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    settings.configure(default_settings=test_settings)
+    django.setup()
+
+from django.utils import timezone  # noqa: E402
+from django.utils.translation import ugettext_lazy  # noqa: E402
+
+from braces.views import StdlibJSONEngine  # noqa: E402
+from braces.views._json import OrjsonJSONEngine, orjson  # noqa: E402
+
+
+def make_record(n):
+    return {
+        'pk': n,
+        'uuid': uuid.UUID(int=n),
+        'title': 'Article number {0}'.format(n),
+        'body': 'Lorem ipsum dolor sit amet, été. ' * 4,
+        'created': datetime.datetime(2017, 1, 1, tzinfo=timezone.utc)
+        + datetime.timedelta(minutes=n),
+        'published': datetime.date(2017, 1, 1),
+        'price': decimal.Decimal('{0}.99'.format(n % 100)),
+        'status': ugettext_lazy('Published'),
+        'tags': ['news', 'python', 'django'],
+        'score': n / 3.0,
+        'active': n % 2 == 0,
+        'editor': None,
+    }
+
+
+PAYLOADS = [
+    ('small dict', {'username': 'bob', 'id': 1, 'is_staff': False}),
+    ('single record', make_record(1)),
+    ('100 records', [make_record(n) for n in range(100)]),
+    ('10000 records', [make_record(n) for n in range(10000)]),
+]
+
+
+def get_engines():
+    engines = [('stdlib', StdlibJSONEngine())]
+    if orjson is not None:
+        engines.append(('orjson', OrjsonJSONEngine()))
+    return engines
+
+
+def best_of(func, number, repeat=3):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--number', type=int, default=None,
+                        help='calls per timing; scaled to the payload '
+                             'size by default')
+    args = parser.parse_args()
+
+    engines = get_engines()
+    if orjson is None:
+        print('orjson is not installed; timing the stdlib engine only.\n')
+
+    print('{0:<16}{1:<10}{2:>14}{3:>14}{4:>10}'.format(
+        'payload', 'engine', 'dumps (us)', 'loads (us)', 'bytes'))
+    for name, payload in PAYLOADS:
+        size = len(StdlibJSONEngine().dumps(payload))
+        number = args.number or max(1, 2000000 // size)
+        encoded = StdlibJSONEngine().dumps(payload, ensure_ascii=False)
+        for engine_name, engine in engines:
+            dumps = best_of(
+                lambda: engine.dumps(payload, ensure_ascii=False), number)
+            loads = best_of(lambda: engine.loads(encoded), number)
+            output = engine.dumps(payload, ensure_ascii=False)
+            print('{0:<16}{1:<10}{2:>14.1f}{3:>14.1f}{4:>10}'.format(
+                name, engine_name, dumps * 1e6, loads * 1e6, len(output)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,11 @@
+import json
+import threading
+
 from django import test
+from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import AnonymousUser
 from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.six.moves import BaseHTTPServer, socketserver
 
 
 class TestViewHelper(object):
@@ -59,3 +64,120 @@ class SetJSONEncoder(DjangoJSONEncoder):
         if isinstance(obj, set):
             return list(obj)
         return super(DjangoJSONEncoder, self).default(obj)
+
+
+class BatchPermissionsBackend(ModelBackend):
+    """
+    A `ModelBackend` that answers `has_perms_batch` and records how often it
+    was asked.
+    """
+    batch_calls = 0
+
+    def has_perms_batch(self, user_obj, perm_list, obj=None):
+        BatchPermissionsBackend.batch_calls += 1
+        if not user_obj.is_active:
+            return set()
+        return set(perm_list) & self.get_all_permissions(user_obj, obj)
+
+
+class AuthorPermissionsBackend(object):
+    """
+    Grants change and delete permissions on articles to their authors, with
+    batched object permission lookups.
+    """
+    author_perms = ('tests.change_article', 'tests.delete_article')
+    has_perm_calls = 0
+    batch_calls = 0
+
+    def authenticate(self, request, **credentials):
+        return None
+
+    def has_perm(self, user_obj, perm, obj=None):
+        AuthorPermissionsBackend.has_perm_calls += 1
+        return (perm in self.author_perms and obj is not None and
+                obj.author_id == user_obj.pk)
+
+    def get_objects_perms(self, user_obj, perm_list, objects):
+        AuthorPermissionsBackend.batch_calls += 1
+        perms = set(perm_list).intersection(self.author_perms)
+        return dict((obj.pk, perms) for obj in objects
+                    if obj.author_id == user_obj.pk)
+
+    def filter_objects_by_perm(self, user_obj, perm, queryset):
+        AuthorPermissionsBackend.batch_calls += 1
+        if perm not in self.author_perms:
+            return queryset.none()
+        return queryset.filter(author=user_obj)
+
+
+class UnbatchedAuthorPermissionsBackend(object):
+    """
+    Same as `AuthorPermissionsBackend`, answering one `has_perm` at a time.
+    """
+    authenticate = AuthorPermissionsBackend.__dict__['authenticate']
+    has_perm = AuthorPermissionsBackend.__dict__['has_perm']
+    author_perms = AuthorPermissionsBackend.author_perms
+
+
+class PolicyDecisionHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers policy decision requests from `server.grants`, a set of
+    `(user id, action)` pairs, or with `server.status` if it isn't 200.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        self.server.requests.append(payload)
+
+        if self.server.status == 200:
+            user_id = payload['subject']['id']
+            body = json.dumps({'decisions': dict(
+                (action, (user_id, action) in self.server.grants)
+                for action in payload['actions'])}).encode('utf-8')
+        else:
+            body = b'error'
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubPolicyServer(socketserver.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    """
+    In-process policy decision point for testing `RemotePolicyBackend`.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(
+            self, ('127.0.0.1', 0), PolicyDecisionHandler)
+        self.grants = set()
+        self.requests = []
+        self.connections = 0
+        self.status = 200
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}/decide'.format(self.server_address[1])
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.shutdown()
+            self.server_close()
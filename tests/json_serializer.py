@@ -0,0 +1,13 @@
+"""
+A "json" serializer marking each object it outputs, for testing
+JSONResponseMixin with SERIALIZATION_MODULES.
+"""
+from django.core.serializers.json import Deserializer  # noqa: F401
+from django.core.serializers.json import Serializer as JSONSerializer
+
+
+class Serializer(JSONSerializer):
+    def get_dump_object(self, obj):
+        data = super(Serializer, self).get_dump_object(obj)
+        data['custom'] = True
+        return data
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 
@@ -28,3 +30,39 @@ class CanonicalArticle(models.Model):
         if self.author:
             return "{0.author.username}-{0.slug}".format(self)
         return "unauthored-{0.slug}".format(self)
+
+
+class AccessAuditRecord(models.Model):
+    timestamp = models.DateTimeField()
+    user_id = models.IntegerField(null=True)
+    username = models.CharField(max_length=150, null=True)
+    view = models.CharField(max_length=200)
+    check = models.CharField(max_length=100, null=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=200)
+    granted = models.BooleanField()
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=30, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def natural_key(self):
+        return (self.name,)
+
+
+class Post(models.Model):
+    author = models.ForeignKey(
+        'auth.User',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE
+    )
+    title = models.CharField(max_length=30)
+    uid = models.UUIDField(default=uuid.uuid4)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+    published = models.DateTimeField(null=True)
+    duration = models.DurationField(null=True)
+    tags = models.ManyToManyField(Tag, blank=True)
@@ -1,13 +1,26 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
+import errno
+import json
+import mock
+import pickle
+import socket
+import threading
+import time
 import pytest
 import datetime
 
 from django import test
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
 from django.test.utils import override_settings
 from django.core.exceptions import ImproperlyConfigured, PermissionDenied
 from django.http import Http404, HttpResponse
+from django.utils.functional import SimpleLazyObject
 from django.utils.timezone import make_aware, get_current_timezone
 
 try:
@@ -15,15 +28,33 @@ try:
 except ImportError:
     from django.core.urlresolvers import reverse_lazy
 
+from braces.views import (AccessAuditLog, AllOf, Authenticated,
+                          CachePermissionStore, CacheRateLimitStore,
+                          HasPerm, InGroup, InMemoryRateLimitStore,
+                          LocalPermissionStore, LoginRequiredMixin,
+                          ModelAuditSink, RateLimitMixin, Staff,
+                          Superuser, bump_permission_versions,
+                          get_access_cache)
+from braces.views._access import (expand_group_names,
+                                  filter_queryset_by_perm,
+                                  load_groups_and_permissions)
+from braces.views._remote import ConnectionPool, get_policy_client
+from braces.views._permissions import PermissionIndex, PermissionSnapshot
+from braces.views._throttling import sliding_window, token_bucket
 from .compat import force_text
-from .factories import GroupFactory, UserFactory
-from .helpers import TestViewHelper
+from .factories import ArticleFactory, GroupFactory, UserFactory, _get_perm
+from .models import AccessAuditRecord, Article
+from .helpers import (AuthorPermissionsBackend, BatchPermissionsBackend,
+                      StubPolicyServer, TestViewHelper)
 from .views import (PermissionRequiredView, MultiplePermissionsRequiredView,
                     SuperuserRequiredView, StaffuserRequiredView,
                     LoginRequiredView, GroupRequiredView, UserPassesTestView,
                     UserPassesTestNotImplementedView, AnonymousRequiredView,
                     SSLRequiredView, RecentLoginRequiredView,
-                    UserPassesTestLoginRequiredView)
+                    UserPassesTestLoginRequiredView, PolicyRequiredView,
+                    PreDispatchRecentLoginRequiredView, RateLimitedView,
+                    ArticlePermissionsListView, SessionLoginRequiredView,
+                    PreloadedAccessView, PermissionsContextView)
 
 
 class _TestAccessBasicsMixin(TestViewHelper):
@@ -251,6 +282,124 @@ class TestLoginRequiredMixin(TestViewHelper, test.TestCase):
         assert resp['Location'] == '/accounts/login/?next=/login_required/'
 
 
+class TestFastDenial(TestViewHelper, test.TestCase):
+    """
+    Tests for the access mixins' fast_denial mode.
+    """
+    view_class = LoginRequiredView
+
+    def dispatch(self, path='/login_required/?page=2&q=a b', accept='',
+                 **kwargs):
+        req = self.build_request(path=path, HTTP_ACCEPT=accept)
+        kwargs.setdefault('fast_denial', True)
+        return self.dispatch_view(req, **kwargs)
+
+    def test_same_redirect_as_default(self):
+        for kwargs in ({}, {'login_url': '/login/?source=app'},
+                       {'login_url': '/login/?source=my app&x=/y'},
+                       {'login_url': '/login/#form'},
+                       {'login_url': '/login/?next=/home/'},
+                       {'login_url': '/login/?next=/home/&source=app'},
+                       {'login_url': 'https://example.com/login/?a=1#b'},
+                       {'redirect_field_name': 'return_to'},
+                       {'login_url': 'headline'}):
+            fast = self.dispatch(**kwargs)
+            slow = self.dispatch(fast_denial=False, **kwargs)
+            assert fast.status_code == 302
+            assert fast['Location'] == slow['Location']
+
+    def test_login_url_resolved_once(self):
+        view_classes = [type('FastView', (LoginRequiredView,), {}),
+                        type('OtherFastView', (LoginRequiredView,), {})]
+        with mock.patch('braces.views._access.resolve_url',
+                        return_value='/accounts/login/') as resolve:
+            for i in range(3):
+                for view_class in view_classes:
+                    self.dispatch(view_class=view_class)
+        assert resolve.call_count == 2
+
+    def test_login_settings_change(self):
+        first = self.dispatch()
+        with self.settings(LOGIN_URL='/signin/'):
+            assert self.dispatch()['Location'].startswith('/signin/?next=')
+        assert self.dispatch()['Location'] == first['Location']
+
+    def test_non_browser_status(self):
+        resp = self.dispatch(accept='application/json',
+                             fast_denial_status=401)
+        assert resp.status_code == 401
+        assert resp.content == b''
+        assert resp['Cache-Control'] == 'private, max-age=60'
+        assert resp['Vary'] == 'Accept, Authorization, Cookie'
+
+    def test_browser_redirected(self):
+        resp = self.dispatch(accept='text/html,application/xhtml+xml',
+                             fast_denial_status=403)
+        assert resp.status_code == 302
+
+    def test_authenticated_user_allowed(self):
+        req = self.build_request(user=UserFactory())
+        resp = self.dispatch_view(req, fast_denial=True)
+        assert force_text(resp.content) == 'OK'
+
+
+class TestSessionLoginRequiredMixin(TestViewHelper, test.TestCase):
+    """
+    Tests for LoginRequiredMixin's session_authentication.
+    """
+    view_class = SessionLoginRequiredView
+    view_url = '/session_login_required/'
+
+    def test_authenticated_without_loading_user(self):
+        user = UserFactory()
+        self.client.login(username=user.username, password='asdf1234')
+        # Only the session is read.
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.view_url)
+        assert force_text(resp.content) == 'OK'
+
+    def test_user_loaded_when_used(self):
+        user = UserFactory()
+        self.client.login(username=user.username, password='asdf1234')
+        with self.assertNumQueries(2):
+            resp = self.client.get('/session_login_required_user/')
+        assert force_text(resp.content) == user.username
+
+    def test_anonymous_without_cookie(self):
+        req = self.build_request(path=self.view_url)
+        req.user = SimpleLazyObject(mock.Mock(side_effect=AssertionError))
+        req.session = mock.MagicMock()
+        resp = self.dispatch_view(req)
+        assert resp.status_code == 302
+        assert not req.session.mock_calls
+
+    def test_anonymous_with_session(self):
+        session = SessionStore()
+        session['cart'] = [1]
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = (
+            session.session_key)
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.view_url)
+        self.assertRedirects(
+            resp, '/accounts/login/?next=/session_login_required/')
+
+    def test_unknown_backend(self):
+        user = UserFactory()
+        self.client.login(username=user.username, password='asdf1234')
+        session = self.client.session
+        session[BACKEND_SESSION_KEY] = 'path.to.RemovedBackend'
+        session.save()
+        resp = self.client.get(self.view_url)
+        assert resp.status_code == 302
+
+    def test_loaded_user_is_used(self):
+        user = UserFactory()
+        resp = self.dispatch_view(
+            self.build_request(path=self.view_url, user=user))
+        assert force_text(resp.content) == 'OK'
+
+
 class TestChainedLoginRequiredMixin(TestViewHelper, test.TestCase):
     """
     Tests for LoginRequiredMixin combined with another AccessMixin.
@@ -488,6 +637,87 @@ class TestMultiplePermissionsRequiredMixin(
                 self.build_request(user=user), raise_exception=True,
                 permissions=permissions)
 
+    def test_permissions_validated_once(self):
+        """
+        The permissions attribute is only validated again when it changes.
+        """
+        class View(MultiplePermissionsRequiredView):
+            pass
+
+        user = self.build_authorized_user()
+        with mock.patch.object(
+                View, '_normalize_permissions',
+                wraps=View(request=None)._normalize_permissions) as m:
+            for i in range(3):
+                self.dispatch_view(self.build_request(user=user),
+                                   view_class=View)
+            assert m.call_count == 1
+
+            View.permissions = {'any': ['auth.change_user']}
+            self.dispatch_view(self.build_request(user=user), view_class=View)
+            assert m.call_count == 2
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'tests.helpers.BatchPermissionsBackend'])
+    def test_batched_permissions(self):
+        """
+        Batch-capable backends are asked for `all` and `any` at once.
+        """
+        BatchPermissionsBackend.batch_calls = 0
+        user = self.build_authorized_user()
+        with mock.patch.object(BatchPermissionsBackend, 'has_perm') as m:
+            resp = self.dispatch_view(self.build_request(user=user))
+        assert force_text(resp.content) == 'OK'
+        assert BatchPermissionsBackend.batch_calls == 1
+        assert not m.called
+
+        user = self.build_unauthorized_user()
+        with self.assertRaises(PermissionDenied):
+            self.dispatch_view(
+                self.build_request(user=user), raise_exception=True)
+        assert BatchPermissionsBackend.batch_calls == 2
+
+    def test_permissions_order_cheapest(self):
+        user = self.build_authorized_user()
+        req = self.build_request(user=user)
+        get_access_cache(req).has_perm(user, 'auth.change_user')
+        view = self.build_view(req, permissions_order='cheapest')
+        assert view.order_permissions(
+            req, ['auth.add_user', 'auth.change_user'], 'any') == [
+            'auth.change_user', 'auth.add_user']
+
+    def test_permissions_order_most_denied(self):
+        class View(MultiplePermissionsRequiredView):
+            permissions = {
+                'all': ['tests.add_article', 'auth.add_user'],
+                'any': ['auth.change_user', 'tests.change_article'],
+            }
+            permissions_order = 'most_denied'
+
+        user = UserFactory(permissions=['tests.add_article'])
+        req = self.build_request(user=user)
+        resp = self.dispatch_view(req, view_class=View)
+        assert resp.status_code == 302
+        assert View._permission_denials['auth.add_user'] == 1
+        assert 'auth.add_user' not in (
+            MultiplePermissionsRequiredView.__dict__.get(
+                '_permission_denials') or {})
+
+        view = self.build_view(req, view_class=View)
+        assert view.order_permissions(
+            req, View.permissions['all'], 'all') == [
+            'auth.add_user', 'tests.add_article']
+        View._permission_denials['auth.change_user'] = 3
+        assert view.order_permissions(
+            req, View.permissions['any'], 'any') == [
+            'tests.change_article', 'auth.change_user']
+
+    def test_invalid_permissions_order(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.dispatch_view(
+                self.build_request(user=self.build_authorized_user()),
+                permissions_order='random')
+
 
 class TestSuperuserRequiredMixin(_TestAccessBasicsMixin, test.TestCase):
     view_class = SuperuserRequiredView
@@ -511,6 +741,72 @@ class TestStaffuserRequiredMixin(_TestAccessBasicsMixin, test.TestCase):
         return UserFactory()
 
 
+class TestObjectPermissionsListMixin(TestViewHelper, test.TestCase):
+    """
+    Tests for ObjectPermissionsListMixin.
+    """
+    view_class = ArticlePermissionsListView
+
+    def setUp(self):
+        super(TestObjectPermissionsListMixin, self).setUp()
+        self.user = UserFactory()
+        self.articles = [ArticleFactory(author=self.user) for i in range(3)]
+        ArticleFactory(author=UserFactory())
+        AuthorPermissionsBackend.has_perm_calls = 0
+        AuthorPermissionsBackend.batch_calls = 0
+
+    def get_objects(self, user):
+        resp = self.dispatch_view(self.build_request(user=user))
+        return list(resp.context_data['object_list'])
+
+    def assert_page(self, objects):
+        assert [obj.pk for obj in objects] == [
+            article.pk for article in self.articles[:2]]
+        for obj in objects:
+            assert obj.allowed_perms == frozenset(
+                AuthorPermissionsBackend.author_perms)
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'tests.helpers.AuthorPermissionsBackend'])
+    def test_batched(self):
+        self.assert_page(self.get_objects(self.user))
+        assert AuthorPermissionsBackend.batch_calls == 2
+        assert AuthorPermissionsBackend.has_perm_calls == 0
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'tests.helpers.UnbatchedAuthorPermissionsBackend'])
+    def test_unbatched_backends(self):
+        self.assert_page(self.get_objects(self.user))
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'tests.helpers.UnbatchedAuthorPermissionsBackend'])
+    def test_unbatched_filter_fetches_once(self):
+        queryset = Article.objects.all()
+        with self.assertNumQueries(1):
+            filtered = filter_queryset_by_perm(
+                self.user, 'tests.change_article', queryset)
+        assert sorted(filtered.values_list('pk', flat=True)) == [
+            article.pk for article in self.articles]
+
+    def test_superuser_sees_everything(self):
+        view = self.build_view(
+            self.build_request(user=UserFactory(is_superuser=True)))
+        assert view.get_queryset().count() == 4
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'tests.helpers.AuthorPermissionsBackend'])
+    def test_no_filter(self):
+        resp = self.dispatch_view(self.build_request(user=self.user),
+                                  object_permission_required=None,
+                                  paginate_by=None)
+        allowed = [obj.allowed_perms
+                   for obj in resp.context_data['object_list']]
+        assert allowed == [
+            frozenset(AuthorPermissionsBackend.author_perms)] * 3 + [
+            frozenset()]
+        assert AuthorPermissionsBackend.batch_calls == 1
+
+
 class TestGroupRequiredMixin(_TestAccessBasicsMixin, test.TestCase):
     view_class = GroupRequiredView
     view_url = '/group_required/'
@@ -586,6 +882,128 @@ class TestGroupRequiredMixin(_TestAccessBasicsMixin, test.TestCase):
         self.view_class.group_required = 'test_group'
         self.assertEqual('test_group', self.view_class.group_required)
 
+    def test_single_exists_query(self):
+        user = self.build_authorized_user()
+        req = self.build_request(user=user, path=self.view_url)
+        with self.assertNumQueries(1):
+            resp = self.dispatch_view(req)
+        assert force_text(resp.content) == 'OK'
+
+
+@override_settings(BRACES_GROUP_HIERARCHY={
+    'test_group': ['eu_group', 'us_group'],
+    'eu_group': ['de_group'],
+})
+class TestNestedGroups(TestViewHelper, test.TestCase):
+    """
+    Tests for group hierarchies in GroupRequiredMixin.
+    """
+    view_class = GroupRequiredView
+
+    def build_user(self, group_name):
+        user = UserFactory()
+        user.groups.add(GroupFactory(name=group_name))
+        return user
+
+    def test_nested_member(self):
+        for name in ('test_group', 'eu_group', 'de_group', 'us_group'):
+            user = self.build_user(name)
+            with self.assertNumQueries(1):
+                resp = self.dispatch_view(self.build_request(user=user))
+            assert force_text(resp.content) == 'OK'
+
+    def test_parent_member_denied_on_child(self):
+        user = self.build_user('test_group')
+        resp = self.dispatch_view(self.build_request(user=user),
+                                  group_required='eu_group')
+        assert resp.status_code == 302
+
+    def test_unrelated_group_denied(self):
+        user = self.build_user('other_group')
+        resp = self.dispatch_view(self.build_request(user=user))
+        assert resp.status_code == 302
+
+    def test_expand_group_names(self):
+        assert expand_group_names(['eu_group', 'unknown']) == frozenset([
+            'eu_group', 'de_group', 'unknown'])
+
+    def test_policy_rule(self):
+        user = self.build_user('de_group')
+        req = self.build_request(user=user)
+        assert InGroup('test_group').check(self.build_view(req), req)
+
+    def test_cycle(self):
+        hierarchy = {'a': ['b'], 'b': ['c'], 'c': ['a']}
+        with override_settings(BRACES_GROUP_HIERARCHY=hierarchy):
+            with self.assertRaises(ImproperlyConfigured):
+                expand_group_names(['a'])
+
+
+@override_settings(BRACES_GROUP_CACHE='default')
+class TestGroupMembershipCache(TestViewHelper, test.TestCase):
+    """
+    Tests for caching GroupRequiredMixin memberships across requests.
+    """
+    view_class = GroupRequiredView
+
+    def setUp(self):
+        super(TestGroupMembershipCache, self).setUp()
+        caches['default'].clear()
+        self.user = UserFactory()
+        self.group = GroupFactory(name='test_group')
+
+    def assert_in_group(self, expected, queries):
+        req = self.build_request(user=self.user, path='/group_required/')
+        view = self.build_view(req)
+        view.request = req
+        with self.assertNumQueries(queries):
+            assert bool(view.check_membership(('test_group',))) is expected
+
+    def test_cached_across_requests(self):
+        self.user.groups.add(self.group)
+        self.assert_in_group(True, 1)
+        self.assert_in_group(True, 0)
+
+    def test_invalidated_by_user_groups(self):
+        self.assert_in_group(False, 1)
+        self.user.groups.add(self.group)
+        self.assert_in_group(True, 1)
+        self.user.groups.clear()
+        self.assert_in_group(False, 1)
+
+    def test_invalidated_by_group_members(self):
+        self.assert_in_group(False, 1)
+        self.group.user_set.add(self.user)
+        self.assert_in_group(True, 1)
+        self.group.user_set.clear()
+        self.assert_in_group(False, 1)
+
+    def test_timeout(self):
+        cache = caches['default']
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.assert_in_group(False, 1)
+            assert cache_set.call_args[0][1:] == (False,)
+            GroupRequiredView.group_cache_timeout = 30
+            try:
+                self.user.groups.add(self.group)
+                self.assert_in_group(True, 1)
+            finally:
+                GroupRequiredView.group_cache_timeout = None
+            assert cache_set.call_args[0][1:] == (True, 30)
+
+    def test_invalidated_by_group_rename(self):
+        self.user.groups.add(self.group)
+        self.assert_in_group(True, 1)
+        self.group.name = 'other_group'
+        self.group.save()
+        self.assert_in_group(False, 1)
+
+    def test_invalidated_by_group_delete(self):
+        self.user.groups.add(self.group)
+        self.assert_in_group(True, 1)
+        self.group.delete()
+        self.assert_in_group(False, 1)
+
 
 class TestUserPassesTestMixin(_TestAccessBasicsMixin, test.TestCase):
     view_class = UserPassesTestView
@@ -629,6 +1047,204 @@ class TestUserPassesTestMixin(_TestAccessBasicsMixin, test.TestCase):
                 raise_exception=True)
 
 
+class TestPolicyRequiredMixin(_TestAccessBasicsMixin, test.TestCase):
+    view_class = PolicyRequiredView
+    view_url = '/policy_required/'
+
+    def build_authorized_user(self):
+        return UserFactory(is_staff=True)
+
+    def build_unauthorized_user(self):
+        return UserFactory()
+
+    def test_group_member(self):
+        user = UserFactory()
+        user.groups.add(GroupFactory(name='test_group'))
+        resp = self.dispatch_view(self.build_request(user=user))
+        assert force_text(resp.content) == 'OK'
+
+    def test_negated_rule(self):
+        user = UserFactory(is_staff=True, email='someone@banned.com')
+        with self.assertRaises(PermissionDenied):
+            self.dispatch_view(
+                self.build_request(user=user), raise_exception=True)
+
+    def test_cheapest_first(self):
+        """
+        Cheap rules run first and stop evaluation once the outcome is known.
+        """
+        user = UserFactory(is_staff=True)
+        policy = HasPerm('auth.add_user') | Staff()
+        with mock.patch.object(HasPerm, 'check') as check:
+            assert policy.compile()(None, self.build_request(user=user))
+        assert not check.called
+
+        user = UserFactory()
+        policy = InGroup('test_group') & Staff()
+        with self.assertNumQueries(0):
+            assert not policy.compile()(None, self.build_request(user=user))
+
+    def test_compiled_once(self):
+        policy = Authenticated() & Staff()
+        with mock.patch.object(AllOf, 'compile',
+                               wraps=policy.compile) as compile:
+            for i in range(2):
+                self.dispatch_view(
+                    self.build_request(user=UserFactory(is_staff=True)),
+                    access_policy=policy)
+        assert compile.call_count == 1
+
+    def test_nested_rules_are_flattened(self):
+        policy = (Staff() & Superuser()) & Authenticated()
+        assert len(policy.rules) == 3
+        policy = Staff() | (Superuser() | Authenticated())
+        assert len(policy.rules) == 3
+
+    def test_has_perm(self):
+        user = UserFactory(permissions=['auth.add_user', 'auth.change_user'])
+        policy = HasPerm('auth.add_user', 'auth.change_user')
+        assert policy.compile()(None, self.build_request(user=user))
+        policy = HasPerm('auth.add_user', 'auth.delete_user')
+        assert not policy.compile()(None, self.build_request(user=user))
+
+    def test_improperly_configured(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.dispatch_view(self.build_request(), access_policy=None)
+
+
+class TestRateLimitMixin(TestViewHelper, test.TestCase):
+    """
+    Tests for RateLimitMixin.
+    """
+    view_class = RateLimitedView
+    view_url = '/rate_limited/'
+
+    def setUp(self):
+        super(TestRateLimitMixin, self).setUp()
+        self.store = InMemoryRateLimitStore()
+        RateLimitedView.rate_limit_store.clear()
+
+    def dispatch(self, user=None, **kwargs):
+        kwargs.setdefault('rate_limit_store', self.store)
+        return self.dispatch_view(
+            self.build_request(user=user, path=self.view_url), **kwargs)
+
+    def test_rejects_over_limit(self):
+        assert self.dispatch().status_code == 200
+        assert self.dispatch().status_code == 200
+        with self.assertNumQueries(0):
+            resp = self.dispatch()
+        assert resp.status_code == 429
+
+    def test_raise_exception(self):
+        self.dispatch(rate_limit='1/m')
+        with self.assertRaises(PermissionDenied):
+            self.dispatch(rate_limit='1/m', raise_exception=True)
+
+    def test_with_login_required(self):
+        class LoginFirst(LoginRequiredMixin, RateLimitedView):
+            pass
+
+        class RateLimitFirst(RateLimitMixin, LoginRequiredView):
+            rate_limit = '2/m'
+
+        for view_class in (LoginFirst, RateLimitFirst):
+            self.store.clear()
+            resp = self.dispatch(view_class=view_class)
+            assert resp.status_code == 302
+            assert resp['Location'].startswith('/accounts/login/?next=')
+
+            user = UserFactory()
+            for i in range(2):
+                resp = self.dispatch(user=user, view_class=view_class)
+                assert resp.status_code == 200
+            resp = self.dispatch(user=user, view_class=view_class)
+            assert resp.status_code == 429
+
+    def test_session_not_read_without_cookie(self):
+        req = self.build_request(path=self.view_url)
+        req.user = SimpleLazyObject(AnonymousUser)
+        req.session = mock.Mock()
+        self.dispatch_view(req, rate_limit_store=self.store)
+        assert not req.session.get.called
+
+    def test_keyed_by_user(self):
+        user, other = UserFactory(), UserFactory()
+        for i in range(2):
+            assert self.dispatch(user=user).status_code == 200
+        assert self.dispatch(user=user).status_code == 429
+        assert self.dispatch(user=other).status_code == 200
+        assert self.dispatch().status_code == 200
+
+    def test_keyed_by_session(self):
+        user = UserFactory()
+        self.client.login(username=user.username, password='asdf1234')
+        for i in range(2):
+            assert self.client.get(self.view_url).status_code == 200
+        assert self.client.get(self.view_url).status_code == 429
+
+    def test_keyed_by_method(self):
+        class View(RateLimitedView):
+            def rate_limit_key(self, request):
+                return 'everyone'
+
+        for i in range(2):
+            self.dispatch(user=UserFactory(), view_class=View)
+        resp = self.dispatch(user=UserFactory(), view_class=View)
+        assert resp.status_code == 429
+
+    def test_in_memory_store_evicts_oldest(self):
+        store = InMemoryRateLimitStore()
+        store.max_entries = 3
+
+        def func(state):
+            return (state or 0) + 1, (state or 0) + 1
+
+        for key in ['a', 'b', 'c', 'a', 'd']:
+            store.update(key, func, 60)
+        assert list(store._data) == ['c', 'a', 'd']
+        assert store.update('a', func, 60) == 3
+        assert store.update('b', func, 60) == 1
+
+    def test_cache_store(self):
+        caches['default'].clear()
+        store = CacheRateLimitStore('default')
+        for i in range(2):
+            assert self.dispatch(rate_limit_store=store).status_code == 200
+        assert self.dispatch(rate_limit_store=store).status_code == 429
+
+    def test_token_bucket_refills(self):
+        allowed, state = token_bucket(None, 2, 60, 0)
+        allowed, state = token_bucket(state, 2, 60, 0)
+        assert allowed
+        allowed, state = token_bucket(state, 2, 60, 1)
+        assert not allowed
+        allowed, state = token_bucket(state, 2, 60, 31)
+        assert allowed
+
+    def test_sliding_window(self):
+        state = None
+        for now in (50, 55):
+            allowed, state = sliding_window(state, 2, 60, now)
+            assert allowed
+        # The previous window still weighs 2 * 55 / 60 requests.
+        allowed, state = sliding_window(state, 2, 60, 65)
+        assert allowed
+        allowed, state = sliding_window(state, 2, 60, 66)
+        assert not allowed
+        allowed, state = sliding_window(state, 2, 60, 119)
+        assert allowed
+        allowed, state = sliding_window(state, 2, 60, 200)
+        assert allowed and state == (3, 1, 0)
+
+    def test_invalid_configuration(self):
+        for rate_limit in (None, '2', '2/x', 'a/m', (0, 60)):
+            with self.assertRaises(ImproperlyConfigured):
+                self.dispatch(rate_limit=rate_limit)
+        with self.assertRaises(ImproperlyConfigured):
+            self.dispatch(rate_limit_algorithm='leaky')
+
+
 class TestSSLRequiredMixin(test.TestCase):
     view_class = SSLRequiredView
     view_url = '/sslrequired/'
@@ -660,6 +1276,51 @@ class TestSSLRequiredMixin(test.TestCase):
         self.assertEqual('https', resp.request.get('wsgi.url_scheme'))
 
 
+class TestSSLRequiredMixinHSTS(TestViewHelper, test.TestCase):
+    """
+    Tests for SSLRequiredMixin's HSTS and proxy support.
+    """
+    view_class = SSLRequiredView
+
+    def test_no_hsts_by_default(self):
+        resp = self.dispatch_view(self.build_request(secure=True))
+        assert 'Strict-Transport-Security' not in resp
+
+    def test_hsts_header(self):
+        resp = self.dispatch_view(
+            self.build_request(secure=True), hsts_max_age=31536000)
+        assert resp['Strict-Transport-Security'] == 'max-age=31536000'
+
+        resp = self.dispatch_view(
+            self.build_request(secure=True), hsts_max_age=600,
+            hsts_include_subdomains=True, hsts_preload=True)
+        assert resp['Strict-Transport-Security'] == (
+            'max-age=600; includeSubDomains; preload')
+
+    def test_no_hsts_on_redirect(self):
+        resp = self.dispatch_view(self.build_request(), hsts_max_age=600,
+                                  raise_exception=False)
+        assert resp.status_code == 301
+        assert resp['Location'] == 'https://testserver/test/'
+        assert 'Strict-Transport-Security' not in resp
+
+    @override_settings(
+        SECURE_PROXY_SSL_HEADER=('HTTP_X_FORWARDED_PROTO', 'https'))
+    def test_secure_proxy_ssl_header(self):
+        req = self.build_request(HTTP_X_FORWARDED_PROTO='https')
+        resp = self.dispatch_view(req, raise_exception=False)
+        assert resp.status_code == 200
+
+    def test_trust_forwarded_proto(self):
+        req = self.build_request(HTTP_X_FORWARDED_PROTO='https, http')
+        resp = self.dispatch_view(req, raise_exception=False)
+        assert resp.status_code == 301
+
+        resp = self.dispatch_view(req, raise_exception=False,
+                                  trust_forwarded_proto=True)
+        assert resp.status_code == 200
+
+
 class TestRecentLoginRequiredMixin(test.TestCase):
     """
     Tests for RecentLoginRequiredMixin.
@@ -693,3 +1354,758 @@ class TestRecentLoginRequiredMixin(test.TestCase):
         user = UserFactory(last_login=last_login)
         resp = self.client.get(self.recent_view_url)
         assert resp.status_code != 200
+
+
+class TestPreDispatchRecentLoginRequiredMixin(test.TestCase):
+    """
+    Tests for RecentLoginRequiredMixin with check_login_before_dispatch.
+    """
+    view_class = PreDispatchRecentLoginRequiredView
+    view_url = '/recent_login_first/'
+
+    def setUp(self):
+        self.view_class.rendered = 0
+        self.view_class.max_last_login_delta = 1800
+
+    def test_recent_login(self):
+        user = UserFactory()
+        self.client.login(username=user.username, password='asdf1234')
+        resp = self.client.get(self.view_url)
+        assert resp.status_code == 200
+        assert b''.join(resp.streaming_content) == b'OK'
+        assert self.view_class.rendered == 1
+
+    def test_outdated_login_skips_view(self):
+        user = UserFactory()
+        self.client.login(username=user.username, password='asdf1234')
+        self.view_class.max_last_login_delta = -1
+        resp = self.client.get(self.view_url)
+        assert resp.status_code == 302
+        assert self.view_class.rendered == 0
+
+    def test_not_logged_in(self):
+        resp = self.client.get(self.view_url)
+        self.assertRedirects(
+            resp, '/accounts/login/?next={0}'.format(self.view_url))
+        assert self.view_class.rendered == 0
+
+
+class TestAccessDecisionCache(TestViewHelper, test.TestCase):
+    """
+    Tests for the request-scoped AccessDecisionCache.
+    """
+    view_class = MultiplePermissionsRequiredView
+
+    def test_cache_is_per_request(self):
+        req = self.build_request()
+        assert get_access_cache(req) is get_access_cache(req)
+        assert get_access_cache(req) is not get_access_cache(
+            self.build_request())
+
+    def test_has_perm_is_memoized(self):
+        user = UserFactory(permissions=['auth.add_user'])
+        cache = get_access_cache(self.build_request(user=user))
+        with mock.patch.object(user, 'has_perm',
+                               wraps=user.has_perm) as has_perm:
+            assert cache.has_perm(user, 'auth.add_user')
+            assert cache.has_perm(user, 'auth.add_user')
+            assert not cache.has_perm(user, 'auth.change_user')
+        assert has_perm.call_count == 2
+        assert cache.hits == 1
+        assert cache.misses == 2
+
+    def test_objects_are_keyed_separately(self):
+        user = UserFactory()
+        cache = get_access_cache(self.build_request(user=user))
+        first, second = ArticleFactory(), ArticleFactory()
+        cache.has_perm(user, 'tests.change_article', first)
+        cache.has_perm(user, 'tests.change_article', second)
+        cache.has_perm(user, 'tests.change_article', first)
+        assert cache.misses == 2
+        assert cache.hits == 1
+
+    def test_group_names_are_memoized(self):
+        user = UserFactory()
+        user.groups.add(GroupFactory(name='editors'))
+        cache = get_access_cache(self.build_request(user=user))
+        with self.assertNumQueries(1):
+            assert cache.get_group_names(user) == frozenset(['editors'])
+            assert cache.get_group_names(user) == frozenset(['editors'])
+
+    def test_clear(self):
+        user = UserFactory()
+        cache = get_access_cache(self.build_request(user=user))
+        assert not cache.has_perm(user, 'auth.add_user')
+        user.user_permissions.add(_get_perm('auth.add_user'))
+        user = type(user).objects.get(pk=user.pk)
+        assert not cache.has_perm(user, 'auth.add_user')
+        cache.clear()
+        assert cache.has_perm(user, 'auth.add_user')
+
+    def test_shared_between_mixins(self):
+        """
+        Permissions already resolved for the request are not asked of the
+        backend again by the mixins.
+        """
+        user = UserFactory(permissions=[
+            'tests.add_article', 'tests.change_article', 'auth.change_user'])
+        req = self.build_request(user=user)
+        cache = get_access_cache(req)
+        cache.has_perms(user, ['tests.add_article', 'tests.change_article'])
+        resp = self.dispatch_view(req)
+        assert force_text(resp.content) == 'OK'
+        assert cache.hits == 2
+
+
+class TestPermissionStores(TestViewHelper, test.TestCase):
+    """
+    Tests for the cross-request permission snapshot stores.
+    """
+    view_class = MultiplePermissionsRequiredView
+    permissions = ['tests.add_article', 'tests.change_article',
+                   'auth.change_user']
+
+    def setUp(self):
+        super(TestPermissionStores, self).setUp()
+        caches['default'].clear()
+
+    def _dispatch(self, user, store):
+        req = self.build_request(user=user)
+        return self.dispatch_view(req, permission_store=store,
+                                  raise_exception=True)
+
+    def _assert_snapshot_reused(self, store):
+        user = UserFactory(permissions=self.permissions)
+        with self.assertNumQueries(2):
+            resp = self._dispatch(user, store)
+        assert force_text(resp.content) == 'OK'
+
+        user = type(user).objects.get(pk=user.pk)
+        with self.assertNumQueries(0):
+            resp = self._dispatch(user, store)
+        assert force_text(resp.content) == 'OK'
+        return user
+
+    def test_local_store_reuses_snapshot(self):
+        self._assert_snapshot_reused(LocalPermissionStore())
+
+    def test_cache_store_reuses_snapshot(self):
+        self._assert_snapshot_reused(CachePermissionStore())
+
+    def test_user_permission_change_invalidates(self):
+        for store in (LocalPermissionStore(), CachePermissionStore()):
+            user = self._assert_snapshot_reused(store)
+            user.user_permissions.remove(_get_perm('auth.change_user'))
+            user = type(user).objects.get(pk=user.pk)
+            with self.assertRaises(PermissionDenied):
+                self._dispatch(user, store)
+
+    def test_group_permission_change_invalidates(self):
+        group = GroupFactory()
+        for store in (LocalPermissionStore(), CachePermissionStore()):
+            user = self._assert_snapshot_reused(store)
+            user.user_permissions.remove(_get_perm('auth.change_user'))
+            user.groups.add(group)
+            user = type(user).objects.get(pk=user.pk)
+            with self.assertRaises(PermissionDenied):
+                self._dispatch(user, store)
+
+            group.permissions.add(_get_perm('auth.change_user'))
+            user = type(user).objects.get(pk=user.pk)
+            assert force_text(self._dispatch(user, store).content) == 'OK'
+            group.permissions.clear()
+
+    def test_other_users_are_not_invalidated(self):
+        store = LocalPermissionStore()
+        user = self._assert_snapshot_reused(store)
+        UserFactory().user_permissions.add(_get_perm('auth.add_user'))
+        with self.assertNumQueries(0):
+            self._dispatch(user, store)
+
+    def test_permission_cache_setting(self):
+        caches['default'].clear()
+        store = CachePermissionStore()
+        user = self._assert_snapshot_reused(store)
+        # Another process, which has no store, changes the permissions.
+        with mock.patch('braces.views._permissions._permission_stores',
+                        set()):
+            user.user_permissions.add(_get_perm('auth.change_user'))
+            assert store.get(user.pk) is not None
+            with self.settings(BRACES_PERMISSION_CACHE='default'):
+                user.user_permissions.add(_get_perm('auth.delete_user'))
+        assert store.get(user.pk) is None
+
+    def test_last_login_update_does_not_invalidate(self):
+        store = LocalPermissionStore()
+        user = self._assert_snapshot_reused(store)
+        user.save(update_fields=['last_login'])
+        assert store.get(user.pk) is not None
+        user.save()
+        assert store.get(user.pk) is None
+
+    def test_inactive_user_is_denied(self):
+        store = LocalPermissionStore()
+        user = self._assert_snapshot_reused(store)
+        type(user).objects.filter(pk=user.pk).update(is_active=False)
+        user = type(user).objects.get(pk=user.pk)
+        with self.assertRaises(PermissionDenied):
+            self._dispatch(user, store)
+
+    def test_local_store_evicts_least_recently_used(self):
+        store = LocalPermissionStore(max_entries=2)
+        store.set(1, frozenset(['a']))
+        store.set(2, frozenset(['b']))
+        store.get(1)
+        store.set(3, frozenset(['c']))
+        assert store.get(1) == frozenset(['a'])
+        assert store.get(2) is None
+        assert store.get(3) == frozenset(['c'])
+
+    def test_local_store_expires(self):
+        store = LocalPermissionStore(timeout=10)
+        with mock.patch('braces.views._permissions.time.time',
+                        return_value=100):
+            store.set(1, frozenset(['a']))
+        with mock.patch('braces.views._permissions.time.time',
+                        return_value=109):
+            assert store.get(1) == frozenset(['a'])
+        with mock.patch('braces.views._permissions.time.time',
+                        return_value=110):
+            assert store.get(1) is None
+
+    def test_change_while_loading_is_not_stored(self):
+        for store in (LocalPermissionStore(), CachePermissionStore()):
+            user = UserFactory(permissions=self.permissions)
+            get_all_permissions = user.get_all_permissions
+
+            def load(obj=None):
+                perms = get_all_permissions(obj)
+                bump_permission_versions([user.pk])
+                return perms
+
+            user.get_all_permissions = load
+            assert 'auth.change_user' in store.get_snapshot(user)
+            assert store.get(user.pk) is None
+
+    def test_local_store_bounds_versions(self):
+        store = LocalPermissionStore(max_entries=10)
+        for pk in range(1000):
+            store.bump_versions([pk])
+            store.set(pk, frozenset(['a']))
+        assert len(store._entries) == 10
+        assert len(store._changes) == 10
+        assert store.get(999) == frozenset(['a'])
+
+        store.set(5000, frozenset(['b']), version=0)
+        assert store.get(5000) is None
+
+    def test_object_permissions_skip_snapshot(self):
+        user = UserFactory()
+        cache = get_access_cache(self.build_request(user=user))
+        cache.set_permission_snapshot(
+            user, frozenset(['tests.change_article']))
+        assert cache.has_perm(user, 'tests.change_article')
+        assert not cache.has_perm(
+            user, 'tests.change_article', ArticleFactory())
+
+
+class TestPreloadUserAccessMixin(TestViewHelper, test.TestCase):
+    """
+    Tests for PreloadUserAccessMixin.
+    """
+    view_class = PreloadedAccessView
+
+    def build_user(self, **kwargs):
+        user = UserFactory(permissions=['tests.add_article'], **kwargs)
+        group = GroupFactory(name='test_group')
+        group.permissions.add(_get_perm('tests.change_article'),
+                              _get_perm('auth.change_user'))
+        user.groups.add(group)
+        return type(user).objects.get(pk=user.pk)
+
+    def test_single_query(self):
+        user = self.build_user()
+        with self.assertNumQueries(1):
+            resp = self.dispatch_view(self.build_request(user=user))
+        assert force_text(resp.content) == 'OK'
+
+    def test_without_preloading(self):
+        user = self.build_user()
+        with mock.patch.object(PreloadedAccessView, 'preload_user_access'):
+            with self.assertNumQueries(3):
+                resp = self.dispatch_view(self.build_request(user=user))
+        assert force_text(resp.content) == 'OK'
+
+    def test_loaded_data(self):
+        user = self.build_user()
+        cache = get_access_cache(self.build_request(user=user))
+        assert load_groups_and_permissions(user) == (
+            set(['test_group']), set(['tests.add_article']),
+            set(['tests.change_article', 'auth.change_user']))
+        assert cache.get_group_names(user) == frozenset(['test_group'])
+
+    def test_denied(self):
+        user = self.build_user()
+        user.user_permissions.clear()
+        with self.assertRaises(PermissionDenied):
+            self.dispatch_view(self.build_request(user=user),
+                               raise_exception=True)
+
+    def test_superuser(self):
+        user = self.build_user(is_superuser=True)
+        user.user_permissions.clear()
+        resp = self.dispatch_view(self.build_request(user=user))
+        assert force_text(resp.content) == 'OK'
+
+    def test_anonymous(self):
+        with self.assertNumQueries(0):
+            resp = self.dispatch_view(self.build_request())
+        assert resp.status_code == 302
+
+
+class TestPermissionsContextMixin(TestViewHelper, test.TestCase):
+    """
+    Tests for PermissionsContextMixin.
+    """
+    view_class = PermissionsContextView
+
+    def test_template_uses_map(self):
+        user = UserFactory(permissions=['auth.add_user', 'auth.delete_user'])
+        self.client.login(username=user.username, password='asdf1234')
+        resp = self.client.get('/permissions_context/')
+        # delete_user wasn't declared, so it reads as False. None of the
+        # declared "tests" permissions is granted, so the app reads as False.
+        assert force_text(resp.content).strip() == 'add auth in'
+        assert resp.context['perms'] == {
+            'auth': {'add_user': True, 'change_user': False},
+            'tests': {'add_article': False},
+        }
+
+    def test_reuses_access_decisions(self):
+        user = UserFactory(permissions=['auth.add_user'])
+        req = self.build_request(user=user)
+        with mock.patch.object(user, 'has_perm',
+                               wraps=user.has_perm) as has_perm:
+            self.dispatch_view(req).render()
+        # add_user was resolved by check_permissions and then reused.
+        assert has_perm.call_count == 3
+        assert get_access_cache(req).hits == 1
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'tests.helpers.BatchPermissionsBackend'])
+    def test_batched(self):
+        BatchPermissionsBackend.batch_calls = 0
+        user = UserFactory(permissions=['auth.add_user'])
+        with mock.patch.object(BatchPermissionsBackend, 'has_perm') as m:
+            m.return_value = True
+            self.dispatch_view(self.build_request(user=user)).render()
+        assert BatchPermissionsBackend.batch_calls == 1
+        assert m.call_count == 1
+
+    def test_bad_config(self):
+        user = UserFactory(permissions=['auth.add_user'])
+        for perms in (None, 'auth.add_user', ['add_user']):
+            with self.assertRaises(ImproperlyConfigured):
+                self.dispatch_view(self.build_request(user=user),
+                                   context_permissions=perms)
+
+
+class TestPermissionPatterns(TestViewHelper, test.TestCase):
+    """
+    Tests for wildcard permissions and the permission index.
+    """
+    view_class = PermissionRequiredView
+
+    def test_index(self):
+        index = PermissionIndex(['blog.change_post', 'blog.add_post',
+                                 'auth.add_user'])
+        assert index.matches('blog.change_post')
+        assert not index.matches('blog.change_pos')
+        assert not index.matches('blog.change_posts')
+        assert index.matches('blog.*')
+        assert index.matches('blog.change_*')
+        assert index.matches('blog.change_post*')
+        assert not index.matches('blog.delete_*')
+        assert not index.matches('news.*')
+        assert not index.matches('auth.add_user_*')
+
+    def test_pattern_without_app_label(self):
+        index = PermissionIndex(['blog.change_post'])
+        for pattern in ('change_*', '*'):
+            with self.assertRaises(ImproperlyConfigured):
+                index.matches(pattern)
+            with self.assertRaises(ImproperlyConfigured):
+                self.dispatch_view(
+                    self.build_request(user=UserFactory(is_superuser=True)),
+                    permission_required=pattern)
+
+    def test_permission_required(self):
+        user = UserFactory(permissions=['auth.change_user'])
+        for perm, allowed in (('auth.*', True), ('auth.change_*', True),
+                              ('auth.add_*', False), ('tests.*', False)):
+            req = self.build_request(user=user)
+            resp = self.dispatch_view(req, permission_required=perm)
+            assert (resp.status_code == 200) == allowed
+
+    def test_multiple_permissions(self):
+        user = UserFactory(permissions=['tests.add_article', 'auth.add_user'])
+        req = self.build_request(user=user)
+        resp = self.dispatch_view(
+            req, view_class=MultiplePermissionsRequiredView,
+            permissions={'all': ['tests.*', 'tests.add_article'],
+                         'any': ['auth.change_*', 'auth.add_*']})
+        assert force_text(resp.content) == 'OK'
+
+    def test_index_built_once_per_snapshot(self):
+        user = UserFactory(permissions=['auth.change_user'])
+        store = LocalPermissionStore()
+        with mock.patch('braces.views._permissions.PermissionIndex',
+                        wraps=PermissionIndex) as index:
+            for i in range(3):
+                req = self.build_request(user=user)
+                resp = self.dispatch_view(req, permission_required='auth.*',
+                                          permission_store=store)
+                assert resp.status_code == 200
+        assert index.call_count == 1
+
+    def test_superuser_and_inactive(self):
+        superuser = UserFactory(is_superuser=True)
+        inactive = UserFactory(permissions=['auth.add_user'], is_active=False)
+        cache = get_access_cache(self.build_request())
+        assert cache.has_perm(superuser, 'news.*')
+        assert not cache.has_perm(inactive, 'auth.*')
+
+    def test_snapshot_pickles_without_index(self):
+        snapshot = PermissionSnapshot(['auth.add_user'])
+        assert snapshot.index.matches('auth.*')
+        clone = pickle.loads(pickle.dumps(snapshot))
+        assert clone == snapshot
+        assert '_index' not in clone.__dict__
+
+
+class TestRemotePolicyBackend(TestViewHelper, test.TestCase):
+    """
+    Tests for RemotePolicyBackend against an in-process decision point.
+    """
+    view_class = MultiplePermissionsRequiredView
+    perms = ['tests.add_article', 'tests.change_article', 'auth.change_user']
+
+    def setUp(self):
+        super(TestRemotePolicyBackend, self).setUp()
+        self.server = StubPolicyServer()
+        self.server.start()
+        self.configure()
+
+    def tearDown(self):
+        self.override.disable()
+        self.server.stop()
+        super(TestRemotePolicyBackend, self).tearDown()
+
+    def configure(self, backends=('braces.views.RemotePolicyBackend',),
+                  **options):
+        if hasattr(self, 'override'):
+            self.override.disable()
+        config = {'URL': self.server.url, 'FAILURE_THRESHOLD': 2}
+        config.update(options)
+        self.override = override_settings(
+            AUTHENTICATION_BACKENDS=list(backends),
+            BRACES_POLICY_DECISION_POINT=config)
+        self.override.enable()
+
+    def build_user(self, perms=None):
+        user = UserFactory()
+        self.server.grants.update(
+            (user.pk, perm) for perm in (perms or self.perms))
+        return user
+
+    def dispatch(self, user):
+        return self.dispatch_view(self.build_request(user=user),
+                                  raise_exception=True)
+
+    def test_one_call_per_request(self):
+        user = self.build_user()
+        assert force_text(self.dispatch(user).content) == 'OK'
+        assert len(self.server.requests) == 1
+        assert set(self.server.requests[0]['actions']) == set(
+            self.perms + ['auth.add_user'])
+        assert self.server.requests[0]['subject'] == {
+            'id': user.pk, 'username': user.username}
+
+    def test_with_model_backend(self):
+        self.configure(backends=['django.contrib.auth.backends.ModelBackend',
+                                 'braces.views.RemotePolicyBackend'])
+        user = self.build_user(perms=self.perms[1:])
+        user.user_permissions.add(_get_perm('tests.add_article'))
+        assert force_text(self.dispatch(user).content) == 'OK'
+        assert len(self.server.requests) == 1
+        assert 'tests.add_article' not in self.server.requests[0]['actions']
+
+        assert self.client.login(username=user.username,
+                                 password='asdf1234')
+        resp = self.client.get('/multiple_permissions_required/')
+        assert resp.status_code == 200
+
+    def test_with_permission_store(self):
+        user = self.build_user()
+        response = self.dispatch_view(
+            self.build_request(user=user), raise_exception=True,
+            permission_store=LocalPermissionStore())
+        assert force_text(response.content) == 'OK'
+        assert len(self.server.requests) == 1
+
+    def test_denied(self):
+        user = self.build_user(perms=['tests.add_article'])
+        with self.assertRaises(PermissionDenied):
+            self.dispatch(user)
+
+    def test_decisions_cached(self):
+        user = self.build_user()
+        self.dispatch(user)
+        self.dispatch(user)
+        assert len(self.server.requests) == 1
+
+    def test_cache_expires(self):
+        self.configure(CACHE_TIMEOUT=10)
+        user = self.build_user()
+        with mock.patch('braces.views._remote.time.time', return_value=100):
+            self.dispatch(user)
+        with mock.patch('braces.views._remote.time.time', return_value=111):
+            self.dispatch(user)
+        assert len(self.server.requests) == 2
+
+    def test_connection_reused(self):
+        for i in range(3):
+            self.dispatch(self.build_user())
+        assert len(self.server.requests) == 3
+        assert self.server.connections == 1
+
+    def test_object_resource(self):
+        user = self.build_user()
+        article = ArticleFactory()
+        assert user.has_perm('tests.change_article', article)
+        assert self.server.requests[0]['resource'] == {
+            'type': 'tests.article', 'id': str(article.pk)}
+
+    def test_fail_closed_and_circuit_opens(self):
+        user = self.build_user()
+        self.server.status = 500
+        for i in range(3):
+            with self.assertRaises(PermissionDenied):
+                self.dispatch(user)
+        # The circuit opened after two failures.
+        assert len(self.server.requests) == 2
+
+    def test_fail_open(self):
+        self.configure(FAIL_OPEN=True)
+        user = self.build_user(perms=[])
+        self.server.status = 500
+        assert force_text(self.dispatch(user).content) == 'OK'
+
+    def test_circuit_recovers(self):
+        self.configure(RESET_TIMEOUT=30)
+        user = self.build_user()
+        self.server.status = 500
+        with mock.patch('braces.views._remote.time.time', return_value=100):
+            for i in range(3):
+                assert not user.has_perm('auth.change_user')
+        self.server.status = 200
+        with mock.patch('braces.views._remote.time.time', return_value=120):
+            assert not user.has_perm('auth.change_user')
+        with mock.patch('braces.views._remote.time.time', return_value=131):
+            assert user.has_perm('auth.change_user')
+            assert user.has_perm('auth.change_user')
+        assert len(self.server.requests) == 3
+
+    def test_unreachable(self):
+        user = self.build_user()
+        self.server.stop()
+        with self.assertRaises(PermissionDenied):
+            self.dispatch(user)
+
+    def test_inactive_and_anonymous(self):
+        user = UserFactory(is_active=False)
+        assert not user.has_perm('auth.change_user')
+        assert not AnonymousUser().has_perm('auth.change_user')
+        assert not self.server.requests
+
+    def test_stale_connection_retried(self):
+        pool = ConnectionPool(self.server.url)
+        stale = mock.Mock()
+        stale.request.side_effect = socket.error(errno.ECONNRESET, 'reset')
+        pool._pool.put(stale)
+        body = json.dumps({'subject': {'id': 1}, 'resource': None,
+                           'actions': []}).encode('utf-8')
+        status, data = pool.post(body, {'Content-Type': 'application/json'})
+        assert status == 200
+        assert stale.close.called
+        pool.close()
+
+    def test_timeout_not_retried(self):
+        pool = ConnectionPool(self.server.url)
+        slow = mock.Mock()
+        slow.request.side_effect = socket.timeout('timed out')
+        pool._pool.put(slow)
+        with mock.patch.object(pool, '_connect') as connect:
+            with self.assertRaises(socket.timeout):
+                pool.post(b'{}', {})
+        assert not connect.called
+
+    def test_client_created_once(self):
+        def create(*args, **kwargs):
+            time.sleep(0.05)
+            return mock.Mock()
+
+        with mock.patch('braces.views._remote.PolicyDecisionClient',
+                        side_effect=create) as client_class:
+            threads = [threading.Thread(target=get_policy_client)
+                       for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert client_class.call_count == 1
+
+    def test_missing_setting(self):
+        with override_settings(BRACES_POLICY_DECISION_POINT=None):
+            with self.assertRaises(ImproperlyConfigured):
+                get_policy_client()
+
+
+class TestAccessAuditLog(TestViewHelper, test.TestCase):
+    """
+    Tests for auditing access decisions.
+    """
+    view_class = PermissionRequiredView
+
+    def setUp(self):
+        super(TestAccessAuditLog, self).setUp()
+        self.batches = []
+        self.audit_log = AccessAuditLog(self.batches.append, batch_size=3,
+                                        flush_interval=60)
+
+    def tearDown(self):
+        self.audit_log.close()
+        super(TestAccessAuditLog, self).tearDown()
+
+    def records(self):
+        return [record for batch in self.batches for record in batch]
+
+    def test_denial_and_grant_recorded(self):
+        user = UserFactory(permissions=['auth.add_user'])
+        self.dispatch_view(self.build_request(path='/ok/', user=user),
+                           audit_log=self.audit_log)
+        self.dispatch_view(self.build_request(path='/denied/'),
+                           audit_log=self.audit_log)
+        self.audit_log.flush()
+
+        granted, denied = self.records()
+        assert granted['granted'] is True
+        assert granted['check'] == 'PermissionRequiredMixin'
+        assert granted['user_id'] == user.pk
+        assert granted['username'] == user.username
+        assert granted['view'] == 'tests.views.PermissionRequiredView'
+        assert granted['path'] == '/ok/'
+        assert denied['granted'] is False
+        assert denied['check'] == 'PermissionRequiredMixin'
+        assert denied['user_id'] is None
+
+    def test_check_names(self):
+        user = UserFactory(permissions=['tests.add_article',
+                                        'tests.change_article',
+                                        'auth.add_user'])
+        self.dispatch_view(self.build_request(user=user),
+                           view_class=MultiplePermissionsRequiredView,
+                           audit_log=self.audit_log, raise_exception=True)
+        self.dispatch_view(self.build_request(), view_class=GroupRequiredView,
+                           audit_log=self.audit_log)
+        view = self.build_view(self.build_request(),
+                               audit_log=self.audit_log)
+        view.handle_no_permission(view.request)
+        self.audit_log.flush()
+
+        assert [(record['check'], record['granted'])
+                for record in self.records()] == [
+            ('MultiplePermissionsRequiredMixin', True),
+            ('GroupRequiredMixin', False),
+            (None, False)]
+
+    def test_flush_and_close_timeouts(self):
+        release = threading.Event()
+        audit_log = AccessAuditLog(lambda batch: release.wait(5),
+                                   batch_size=1, max_queue_size=1,
+                                   put_timeout=0)
+        for i in range(3):
+            audit_log.record({'n': i})
+        started = time.time()
+        assert audit_log.flush(timeout=0.05) is False
+        audit_log.close(timeout=0.05)
+        assert time.time() - started < 1
+        release.set()
+        assert audit_log.flush(timeout=5) is True
+        audit_log.close()
+
+    def test_stale_connections_closed(self):
+        audit_log = AccessAuditLog(self.batches.append, batch_size=1)
+        with mock.patch('braces.views._audit.close_old_connections') as close:
+            audit_log.record({'n': 1})
+            audit_log.flush()
+        assert close.called
+        with mock.patch('braces.views._audit.connections') as connections:
+            audit_log.close()
+        connections.close_all.assert_called_once_with()
+
+    def test_batches(self):
+        for i in range(7):
+            self.audit_log.record({'n': i})
+        self.audit_log.flush()
+        assert [len(batch) for batch in self.batches] == [3, 3, 1]
+
+    def test_flush_interval(self):
+        audit_log = AccessAuditLog(self.batches.append, flush_interval=0.05)
+        audit_log.record({'n': 1})
+        for i in range(100):
+            if self.batches:
+                break
+            time.sleep(0.01)
+        assert self.batches == [[{'n': 1}]]
+        audit_log.close()
+
+    def test_close_flushes(self):
+        self.audit_log.record({'n': 1})
+        self.audit_log.close()
+        assert self.batches == [[{'n': 1}]]
+
+    def test_full_queue_drops(self):
+        release = threading.Event()
+
+        def slow_sink(batch):
+            release.wait(5)
+
+        audit_log = AccessAuditLog(slow_sink, batch_size=1,
+                                   max_queue_size=1, put_timeout=0)
+        for i in range(5):
+            audit_log.record({'n': i})
+        assert audit_log.dropped >= 3
+        release.set()
+        audit_log.close()
+
+    def test_failing_sink(self):
+        def broken_sink(batch):
+            raise ValueError
+
+        audit_log = AccessAuditLog(broken_sink, batch_size=1)
+        audit_log.record({'n': 1})
+        audit_log.flush()
+        assert audit_log.failed == 1
+        audit_log.close()
+
+    def test_model_sink(self):
+        user = UserFactory()
+        req = self.build_request(user=user)
+        records = [self.build_view(req).get_audit_record(req, granted)
+                   for granted in (True, False)]
+        with self.assertNumQueries(1):
+            ModelAuditSink(AccessAuditRecord)(records)
+        assert list(AccessAuditRecord.objects.order_by('pk').values_list(
+            'username', 'granted')) == [(user.username, True),
+                                        (user.username, False)]
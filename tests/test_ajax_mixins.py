@@ -1,19 +1,35 @@
 from __future__ import absolute_import, unicode_literals
 
+import datetime
+import decimal
 import json
 import mock
+import uuid
+
+import django
+import pytest
 
 from django import test
+from django.contrib.auth.models import Group, Permission
+from django.core import serializers
 from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.query import QuerySet
 from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy
 
-from braces.views import AjaxResponseMixin
+from braces.views import (AjaxResponseMixin, OrjsonJSONEngine,
+                          StdlibJSONEngine)
+from braces.views._json import get_default_json_engine, orjson
+from braces.views._serialization import serialize
 
 from .compat import force_text
 from .factories import ArticleFactory, UserFactory
-from .helpers import TestViewHelper
+from .helpers import SetJSONEncoder, TestViewHelper
+from .models import Article, Post, Tag
 from .views import (SimpleJsonView, JsonRequestResponseView,
-                    JsonBadRequestView)
+                    JsonBadRequestView, ArticleStreamJsonView)
 
 
 class TestAjaxResponseMixin(TestViewHelper, test.TestCase):
@@ -144,6 +160,446 @@ class TestJSONResponseMixin(TestViewHelper, test.TestCase):
         self.assertEqual({'numbers': [1, 2, 3]}, data)
 
 
+class TestJSONStreamResponse(TestViewHelper, test.TestCase):
+    """
+    Tests for JSONResponseMixin's render_json_stream_response() method.
+    """
+    view_class = ArticleStreamJsonView
+
+    def get_chunks(self, url):
+        resp = self.client.get(url)
+        assert resp.streaming
+        return resp, list(resp.streaming_content)
+
+    def test_json_array(self):
+        articles = [ArticleFactory() for __ in range(5)]
+        resp, chunks = self.get_chunks('/article_stream_json/')
+        assert resp['Content-Type'] == 'application/json'
+        assert len(chunks) > 1
+        data = json.loads(b''.join(chunks).decode('utf-8'))
+        assert data == [{'pk': a.pk, 'title': a.title} for a in articles]
+
+    def test_ndjson(self):
+        articles = [ArticleFactory() for __ in range(3)]
+        resp, chunks = self.get_chunks('/article_stream_json/?ndjson=1')
+        assert resp['Content-Type'] == 'application/x-ndjson'
+        lines = b''.join(chunks).decode('utf-8').split('\n')
+        assert lines[-1] == ''
+        assert [json.loads(line) for line in lines[:-1]] == [
+            {'pk': a.pk, 'title': a.title} for a in articles]
+
+    def test_empty(self):
+        resp, chunks = self.get_chunks('/article_stream_json/')
+        assert b''.join(chunks) == b'[]'
+        resp, chunks = self.get_chunks('/article_stream_json/?ndjson=1')
+        assert b''.join(chunks) == b''
+
+    def test_chunks_bounded(self):
+        view = self.build_view(self.build_request())
+        items = ({'n': 'x' * 10} for __ in range(100))
+        chunks = list(view.iter_json_stream(items))
+        # 64 byte buffer, plus at most one 19 byte item and its separator.
+        assert max(len(chunk) for chunk in chunks) <= 64 + 21
+        assert len(json.loads(b''.join(chunks).decode('utf-8'))) == 100
+
+    def test_queryset_iterator(self):
+        ArticleFactory()
+        view = self.build_view(self.build_request(),
+                               json_engine=StdlibJSONEngine())
+        queryset = Article.objects.values('pk')
+        with mock.patch.object(QuerySet, 'iterator',
+                               return_value=iter([{'pk': 1}])) as iterator:
+            assert b''.join(view.iter_json_stream(queryset)) == b'[{"pk": 1}]'
+        if django.VERSION >= (2, 0):
+            iterator.assert_called_once_with(chunk_size=2000)
+        else:
+            iterator.assert_called_once_with()
+
+    def test_indent_ignored_for_ndjson(self):
+        view = self.build_view(self.build_request(),
+                               json_dumps_kwargs={'indent': 2},
+                               json_engine=StdlibJSONEngine())
+        content = b''.join(view.iter_json_stream([{'a': [1, 2]}], True))
+        assert content == b'{"a": [1, 2]}\n'
+
+
+class TestJSONEngines(TestViewHelper, test.TestCase):
+    """
+    Tests for the JSON engines and JSONResponseMixin's get_json_engine().
+    """
+    view_class = SimpleJsonView
+
+    def get_payload(self):
+        return {
+            'naive': datetime.datetime(2017, 1, 2, 3, 4, 5, 678901),
+            'aware': datetime.datetime(2017, 1, 2, 3, 4, 5,
+                                       tzinfo=timezone.utc),
+            'date': datetime.date(2017, 1, 2),
+            'time': datetime.time(3, 4, 5, 678901),
+            'delta': datetime.timedelta(days=1, seconds=5),
+            'amount': decimal.Decimal('10.10'),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'lazy': ugettext_lazy('Hello'),
+            'nested': [{'text': '\u00e9t\u00e9', 'number': 1.5}, None],
+        }
+
+    def test_stdlib_matches_django_encoder(self):
+        payload = self.get_payload()
+        expected = json.dumps(payload, cls=DjangoJSONEncoder,
+                              ensure_ascii=False).encode('utf-8')
+        assert StdlibJSONEngine().dumps(payload,
+                                        ensure_ascii=False) == expected
+
+    @pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+    def test_orjson_matches_stdlib(self):
+        payload = self.get_payload()
+        stdlib, fast = StdlibJSONEngine(), OrjsonJSONEngine()
+        for kwargs in [{}, {'ensure_ascii': False}, {'indent': 2},
+                       {'sort_keys': True}]:
+            assert (json.loads(fast.dumps(payload, **kwargs).decode('utf-8'))
+                    == json.loads(stdlib.dumps(payload, **kwargs)
+                                  .decode('utf-8')))
+
+    @pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+    def test_orjson_falls_back(self):
+        stdlib, fast = StdlibJSONEngine(), OrjsonJSONEngine()
+        for payload, kwargs in [({'a': '\u00e9'}, {'ensure_ascii': True}),
+                                ({'a': [1]}, {'indent': 4}),
+                                ({'a': [1]}, {'separators': (',', ' : ')}),
+                                ({'a': 2 ** 70}, {})]:
+            assert (fast.dumps(payload, **kwargs)
+                    == stdlib.dumps(payload, **kwargs))
+
+    def test_unknown_types_raise(self):
+        engines = [StdlibJSONEngine()]
+        if orjson is not None:
+            engines.append(OrjsonJSONEngine())
+        for engine in engines:
+            with self.assertRaises(TypeError):
+                engine.dumps({'a': object()})
+
+    def test_loads(self):
+        engines = [StdlibJSONEngine()]
+        if orjson is not None:
+            engines.append(OrjsonJSONEngine())
+        for engine in engines:
+            assert engine.loads(b'{"a": ["\xc3\xa9"]}') == {'a': ['\u00e9']}
+            assert engine.loads('[1]') == [1]
+            with self.assertRaises(ValueError):
+                engine.loads(b'{"a": ')
+            with self.assertRaises(ValueError):
+                engine.loads(b'\xff')
+
+    @pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+    def test_orjson_loads_falls_back(self):
+        stdlib, fast = StdlibJSONEngine(), OrjsonJSONEngine()
+        for data in [b'[18446744073709551616]', '[-9223372036854775809]',
+                     b'{"a": 1.5, "b": NaN}', b'[1e400]']:
+            expected = stdlib.loads(data)
+            decoded = fast.loads(data)
+            assert repr(decoded) == repr(expected)
+            assert [type(value) for value in decoded] == [
+                type(value) for value in expected]
+
+    def test_default_engine(self):
+        engine = get_default_json_engine()
+        assert type(engine) is StdlibJSONEngine
+        assert get_default_json_engine() is engine
+
+    def test_engine_setting(self):
+        with self.settings(
+                BRACES_JSON_ENGINE='braces.views.StdlibJSONEngine'):
+            engine = get_default_json_engine()
+            assert type(engine) is StdlibJSONEngine
+            view = self.build_view(self.build_request())
+            assert view.get_json_engine() is engine
+
+    def test_view_engine(self):
+        engine = mock.Mock(dumps=mock.Mock(return_value=b'{}'))
+        view = self.build_view(self.build_request(), json_engine=engine)
+        response = view.render_json_response({'a': 1})
+        assert response.content == b'{}'
+        engine.dumps.assert_called_once_with(
+            {'a': 1}, **view.get_json_dumps_kwargs())
+
+    def test_encoder_class_engine(self):
+        view = self.build_view(self.build_request(),
+                               json_encoder_class=SetJSONEncoder)
+        engine = view.get_json_engine()
+        assert type(engine) is StdlibJSONEngine
+        assert engine.encoder_class is SetJSONEncoder
+        assert view.get_json_engine() is engine
+
+
+class TestJSONObjectResponse(TestViewHelper, test.TestCase):
+    """
+    Tests for JSONResponseMixin's values_list() based object serialization.
+    """
+    view_class = SimpleJsonView
+
+    def setUp(self):
+        super(TestJSONObjectResponse, self).setUp()
+        user = UserFactory()
+        tags = [Tag.objects.create(name=name) for name in 'cab']
+        for n in range(3):
+            post = Post.objects.create(
+                author=user if n else None, title='Post \u00e9 {0}'.format(n),
+                price=decimal.Decimal('{0}.50'.format(n)),
+                published=(timezone.now() if n != 1 else None),
+                duration=datetime.timedelta(hours=n))
+            post.tags.set(tags[:n])
+
+    def get_view(self, **kwargs):
+        kwargs.setdefault('json_engine', StdlibJSONEngine())
+        return self.build_view(self.build_request(), **kwargs)
+
+    def test_matches_serializer(self):
+        view = self.get_view()
+        queryset = Post.objects.order_by('pk')
+        for options in [{}, {'indent': 2}, {'ensure_ascii': False},
+                        {'fields': ('title', 'author', 'tags')},
+                        {'fields': ('price',), 'sort_keys': True}]:
+            expected = serializers.serialize('json', queryset, **options)
+            content = b''.join(view.iter_json_objects(queryset, **options))
+            assert content == expected.encode('utf-8'), options
+
+    def test_empty(self):
+        view = self.get_view()
+        for options in [{}, {'indent': 2}]:
+            queryset = Post.objects.none()
+            expected = serializers.serialize('json', queryset, **options)
+            content = b''.join(view.iter_json_objects(queryset, **options))
+            assert content == expected.encode('utf-8')
+
+    @pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+    def test_orjson(self):
+        view = self.get_view(json_engine=OrjsonJSONEngine())
+        queryset = Post.objects.order_by('pk')
+        for options in [{}, {'indent': 2}]:
+            expected = serializers.serialize('json', queryset, **options)
+            content = b''.join(view.iter_json_objects(queryset, **options))
+            assert json.loads(content.decode('utf-8')) == json.loads(expected)
+
+    def test_queries(self):
+        view = self.get_view()
+        with self.assertNumQueries(2):
+            view.render_json_object_response(Post.objects.all())
+        with self.assertNumQueries(1):
+            view.render_json_object_response(Post.objects.all(),
+                                             fields=('title', 'author'))
+
+    def test_batches(self):
+        view = self.get_view(json_stream_chunk_size=2)
+        queryset = Post.objects.order_by('pk')
+        with self.assertNumQueries(3):
+            content = b''.join(view.iter_json_objects(queryset))
+        expected = serializers.serialize('json', queryset)
+        assert content == expected.encode('utf-8')
+
+    def test_serializer_fallback(self):
+        view = self.get_view()
+        with mock.patch('braces.views._ajax.serialize',
+                        return_value='[]') as serialize:
+            view.render_json_object_response(list(Post.objects.all()))
+            view.render_json_object_response(Post.objects.all(),
+                                             cls=DjangoJSONEncoder)
+            view.json_object_fast_path = False
+            view.render_json_object_response(Post.objects.all())
+        assert serialize.call_count == 3
+
+    @test.override_settings(
+        SERIALIZATION_MODULES={'json': 'tests.json_serializer'})
+    def test_serialization_modules(self):
+        view = self.get_view()
+        queryset = Post.objects.order_by('pk')
+        expected = serializers.serialize('json', queryset)
+        assert '"custom": true' in expected
+        for objects in [queryset, list(queryset)]:
+            response = view.render_json_object_response(objects)
+            assert response.content == expected.encode('utf-8')
+
+    def test_natural_keys(self):
+        view = self.get_view()
+        for options in [{'use_natural_foreign_keys': True},
+                        {'use_natural_foreign_keys': True,
+                         'fields': ('author',)}]:
+            queryset = Post.objects.order_by('pk')
+            expected = serializers.serialize('json', queryset, **options)
+            content = b''.join(view.iter_json_objects(queryset, **options))
+            assert content == expected.encode('utf-8')
+
+        queryset = Tag.objects.all()
+        options = {'use_natural_foreign_keys': True,
+                   'use_natural_primary_keys': True}
+        expected = serializers.serialize('json', queryset, **options)
+        content = b''.join(view.iter_json_objects(queryset, **options))
+        assert content == expected.encode('utf-8')
+        assert b'"pk"' not in content
+
+    def test_natural_keys_queries(self):
+        view = self.get_view()
+        queryset = Post.objects.order_by('pk')
+        with self.assertNumQueries(4):
+            view.render_json_object_response(
+                queryset, use_natural_foreign_keys=True)
+        post = Post.objects.create(author=UserFactory(), title='More',
+                                   price=1)
+        post.tags.set(Tag.objects.all())
+        with self.assertNumQueries(4):
+            view.render_json_object_response(
+                queryset, use_natural_foreign_keys=True)
+
+    def test_natural_key_dependencies(self):
+        for n in range(3):
+            group = Group.objects.create(name='group {0}'.format(n))
+            group.permissions.set(Permission.objects.all()[:n + 2])
+        view = self.get_view()
+        queryset = Group.objects.order_by('pk')
+        expected = serializers.serialize('json', queryset,
+                                         use_natural_foreign_keys=True)
+        with self.assertNumQueries(3):
+            content = b''.join(view.iter_json_objects(
+                queryset, use_natural_foreign_keys=True))
+        assert content == expected.encode('utf-8')
+
+        groups = list(queryset)
+        with self.assertNumQueries(2):
+            content = serialize(groups, use_natural_foreign_keys=True)
+        assert content == expected
+
+    def test_serializer_prefetches(self):
+        for options in [{}, {'use_natural_foreign_keys': True}]:
+            expected = serializers.serialize(
+                'json', Post.objects.order_by('pk'), **options)
+            posts = list(Post.objects.order_by('pk'))
+            with self.assertNumQueries(1 + len(options)):
+                content = serialize(posts, **options)
+            assert content == expected
+
+        queryset = Post.objects.order_by('pk')
+        expected = serializers.serialize('json', queryset,
+                                         use_natural_foreign_keys=True)
+        with self.assertNumQueries(3):
+            content = serialize(queryset, use_natural_foreign_keys=True)
+        assert content == expected
+
+    def test_stream(self):
+        view = self.get_view(json_stream_buffer_size=64)
+        queryset = Post.objects.order_by('pk')
+        response = view.render_json_object_stream_response(queryset)
+        chunks = list(response.streaming_content)
+        assert len(chunks) > 1
+        expected = serializers.serialize('json', queryset)
+        assert b''.join(chunks) == expected.encode('utf-8')
+
+        response = view.render_json_object_stream_response(list(queryset))
+        assert b''.join(response.streaming_content) == expected.encode(
+            'utf-8')
+
+
+class TestJSONConditionalResponses(TestViewHelper, test.TestCase):
+    """
+    Tests for JSONResponseMixin's ETags and 304 Not Modified responses.
+    """
+    view_class = SimpleJsonView
+
+    def get_view(self, etag=None, method='GET', **kwargs):
+        headers = {}
+        if etag is not None:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        request = self.build_request(method=method, **headers)
+        return self.build_view(request, **kwargs)
+
+    def test_no_etag_by_default(self):
+        response = self.get_view().render_json_response({'a': 1})
+        assert not response.has_header('ETag')
+
+    def test_content_etag(self):
+        response = self.get_view(json_etags=True).render_json_response(
+            {'a': 1})
+        etag = response['ETag']
+        assert etag.startswith('"') and etag.endswith('"')
+
+        view = self.get_view(etag, json_etags=True)
+        response = view.render_json_response({'a': 1})
+        assert response.status_code == 304
+        assert response.content == b''
+        assert response['ETag'] == etag
+
+        response = view.render_json_response({'a': 2})
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+        assert json.loads(response.content.decode('utf-8')) == {'a': 2}
+
+    def test_version_skips_encoding(self):
+        engine = mock.Mock(dumps=mock.Mock(return_value=b'{}'))
+        response = self.get_view(json_engine=engine).render_json_response(
+            {'a': 1}, version=3)
+        etag = response['ETag']
+        assert engine.dumps.call_count == 1
+
+        view = self.get_view(etag, json_engine=engine)
+        response = view.render_json_response({'a': 1}, version=3)
+        assert response.status_code == 304
+        assert response['ETag'] == etag
+        assert engine.dumps.call_count == 1
+
+        response = view.render_json_response({'a': 1}, version=4)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    def test_only_safe_methods_and_success(self):
+        etag = self.get_view().get_json_etag(version=1)
+        response = self.get_view(etag, method='POST').render_json_response(
+            {'a': 1}, version=1)
+        assert response.status_code == 200
+
+        response = self.get_view(etag).render_json_response(
+            {'a': 1}, status=400, version=1)
+        assert response.status_code == 400
+        assert not response.has_header('ETag')
+
+    def test_object_response(self):
+        ArticleFactory()
+        queryset = Article.objects.all()
+        etag = self.get_view().render_json_object_response(
+            queryset, version='v1')['ETag']
+        with self.assertNumQueries(0):
+            response = self.get_view(etag).render_json_object_response(
+                queryset, version='v1', fields=('title',))
+        assert response.status_code == 304
+
+        response = self.get_view(json_etags=True).render_json_object_response(
+            queryset)
+        view = self.get_view(response['ETag'], json_etags=True)
+        assert view.render_json_object_response(queryset).status_code == 304
+
+    def test_stream_responses(self):
+        ArticleFactory()
+        queryset = Article.objects.all()
+        view = self.get_view()
+        response = view.render_json_object_stream_response(queryset,
+                                                           version=1)
+        assert response.streaming
+        etag = response['ETag']
+
+        view = self.get_view(etag)
+        with self.assertNumQueries(0):
+            response = view.render_json_object_stream_response(queryset,
+                                                               version=1)
+            assert response.status_code == 304
+            response = view.render_json_stream_response(
+                queryset.values('pk'), version=1)
+            assert response.status_code == 304
+
+        articles = list(queryset)
+        with mock.patch('braces.views._ajax.serialize') as serialize:
+            response = view.render_json_object_stream_response(articles,
+                                                               version=1)
+        assert response.status_code == 304
+        assert not serialize.called
+
+
 class TestJsonRequestResponseMixin(TestViewHelper, test.TestCase):
     view_class = JsonRequestResponseView
     request_dict = {'status': 'operational'}
@@ -187,6 +643,13 @@ class TestJsonRequestResponseMixin(TestViewHelper, test.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response_json, {'error': 'you messed up'})
 
+    def test_get_request_json_uses_engine(self):
+        engine = mock.Mock(loads=mock.Mock(return_value={'a': 1}))
+        view = self.build_view(self.build_request(), json_engine=engine)
+        view.request = self.build_request()
+        assert view.get_request_json() == {'a': 1}
+        engine.loads.assert_called_once_with(view.request.body)
+
 
 class TestJsonBadRequestMixin(TestViewHelper, test.TestCase):
     view_class = JsonBadRequestView
@@ -20,7 +20,8 @@ from .factories import UserFactory
 from .helpers import TestViewHelper
 from .models import Article, CanonicalArticle
 from .views import (ArticleListView, ArticleListViewWithCustomQueryset,
-                    AuthorDetailView, OrderableListView,
+                    AuthorDetailView, CachedObjectPermissionView,
+                    OrderableListView,
                     FormMessagesView, ContextView)
 
 
@@ -167,6 +168,19 @@ class TestSelectRelatedMixin(TestViewHelper, test.TestCase):
         with self.assertRaises(ImproperlyConfigured):
             self.dispatch_view(self.build_request(), select_related={'a': 1})
 
+    def test_select_related_validated_once(self):
+        """
+        The select_related attribute is validated on first use only.
+        """
+        class View(ArticleListView):
+            select_related = ['author']
+
+        with mock.patch.object(View, '_normalize_select_related',
+                               return_value=('author',)) as m:
+            self.dispatch_view(self.build_request(), view_class=View)
+            self.dispatch_view(self.build_request(), view_class=View)
+        assert m.call_count == 1
+
     @mock.patch('django.db.models.query.QuerySet.select_related')
     def test_select_related_called(self, m):
         """
@@ -403,6 +417,45 @@ class TestCanonicalSlugDetailView(test.TestCase):
         self.assertEqual(resp.status_code, 301)
 
 
+class TestCachedObjectMixin(TestViewHelper, test.TestCase):
+    """
+    Tests for CachedObjectMixin.
+    """
+    view_class = CachedObjectPermissionView
+
+    def setUp(self):
+        super(TestCachedObjectMixin, self).setUp()
+        self.article = Article.objects.create(
+            title='Alpha', body='Zet', slug='alpha')
+
+    def test_canonical_slug_fetches_once(self):
+        with self.assertNumQueries(1):
+            resp = self.client.get('/article-canonical-override/1-nycun/')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_object_permissions_fetch_once(self):
+        user = UserFactory(is_superuser=True)
+        req = self.build_request(user=user)
+        with self.assertNumQueries(1):
+            resp = self.dispatch_view(req, kwargs={'pk': self.article.pk})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_invalidate_object(self):
+        view = self.build_view(self.build_request(),
+                               kwargs={'pk': self.article.pk})
+        assert view.get_object() is view.get_object()
+        Article.objects.filter(pk=self.article.pk).update(title='Beta')
+        assert view.get_object().title == 'Alpha'
+        view.invalidate_object()
+        assert view.get_object().title == 'Beta'
+
+    def test_explicit_queryset_is_not_cached(self):
+        view = self.build_view(self.build_request(),
+                               kwargs={'pk': self.article.pk})
+        queryset = Article.objects.all()
+        assert view.get_object(queryset) is not view.get_object(queryset)
+
+
 class TestNamespaceAwareCanonicalSlugDetailView(test.TestCase):
     def setUp(self):
         Article.objects.create(title='Alpha', body='Zet', slug='alpha')
@@ -8,6 +8,10 @@ from .compat import include, url, patterns_compat
 urlpatterns = [
     # LoginRequiredMixin tests
     url(r'^login_required/$', views.LoginRequiredView.as_view()),
+    url(r'^session_login_required/$',
+        views.SessionLoginRequiredView.as_view()),
+    url(r'^session_login_required_user/$',
+        views.SessionLoginRequiredUserView.as_view()),
 
     # AnonymousRequiredView tests
     url(r'^unauthenticated_view/$', views.AnonymousRequiredView.as_view(),
@@ -78,6 +82,13 @@ urlpatterns = [
     url(r'^user_passes_test_not_implemented/$',
         views.UserPassesTestNotImplementedView.as_view()),
 
+    # PolicyRequiredMixin tests
+    url(r'^policy_required/$', views.PolicyRequiredView.as_view()),
+    url(r'^permissions_context/$', views.PermissionsContextView.as_view()),
+
+    # RateLimitMixin tests
+    url(r'^rate_limited/$', views.RateLimitedView.as_view()),
+
     # CsrfExemptMixin tests
     url(r'^csrf_exempt/$', views.CsrfExemptView.as_view()),
 
@@ -87,6 +98,7 @@ urlpatterns = [
         views.CustomJsonEncoderView.as_view()),
     url(r'^simple_json_400/$', views.SimpleJsonBadRequestView.as_view()),
     url(r'^article_list_json/$', views.ArticleListJsonView.as_view()),
+    url(r'^article_stream_json/$', views.ArticleStreamJsonView.as_view()),
 
     # JsonRequestResponseMixin tests
     url(r'^json_request/$', views.JsonRequestResponseView.as_view()),
@@ -108,6 +120,8 @@ urlpatterns = [
     # RecentLoginRequiredMixin tests
     url(r'^recent_login/$', views.RecentLoginRequiredView.as_view()),
     url(r'^outdated_login/$', views.RecentLoginRequiredView.as_view()),
+    url(r'^recent_login_first/$',
+        views.PreDispatchRecentLoginRequiredView.as_view()),
 
     # HeaderMixin tests
     url(r'^headers/attribute/$', views.AttributeHeaderView.as_view()),
@@ -3,7 +3,7 @@ from __future__ import absolute_import
 import codecs
 
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import (View, UpdateView, FormView, TemplateView,
                                   ListView, DetailView, CreateView)
@@ -38,6 +38,22 @@ class LoginRequiredView(views.LoginRequiredMixin, OkView):
     """
 
 
+class SessionLoginRequiredView(views.LoginRequiredMixin, OkView):
+    """
+    A view for testing LoginRequiredMixin's session_authentication.
+    """
+    session_authentication = True
+
+
+class SessionLoginRequiredUserView(SessionLoginRequiredView):
+    """
+    A view for testing that session_authentication still loads the user
+    when the view uses it.
+    """
+    def get(self, request):
+        return HttpResponse(request.user.username)
+
+
 class AnonymousRequiredView(views.AnonymousRequiredMixin, OkView):
     """
     A view for testing AnonymousRequiredMixin. Should accept
@@ -113,6 +129,19 @@ class ArticleListJsonView(views.JSONResponseMixin, View):
             queryset, fields=('title',))
 
 
+class ArticleStreamJsonView(views.JSONResponseMixin, View):
+    """
+    A view for testing JSONResponseMixin's render_json_stream_response()
+    method.
+    """
+    json_stream_buffer_size = 64
+
+    def get(self, request):
+        queryset = Article.objects.order_by('pk').values('pk', 'title')
+        return self.render_json_stream_response(
+            queryset, ndjson='ndjson' in request.GET)
+
+
 class JsonRequestResponseView(views.JsonRequestResponseMixin, View):
     """
     A view for testing JsonRequestResponseMixin's json conversion
@@ -256,6 +285,30 @@ class MultiplePermissionsRequiredView(views.MultiplePermissionsRequiredMixin,
     }
 
 
+class PreloadedAccessView(views.PreloadUserAccessMixin,
+                          views.GroupRequiredMixin,
+                          views.MultiplePermissionsRequiredMixin, OkView):
+    """
+    View for testing PreloadUserAccessMixin.
+    """
+    group_required = 'test_group'
+    permissions = {
+        'all': ['tests.add_article', 'tests.change_article'],
+        'any': ['auth.add_user', 'auth.change_user'],
+    }
+
+
+class PermissionsContextView(views.PermissionRequiredMixin,
+                             views.PermissionsContextMixin, TemplateView):
+    """
+    View for testing PermissionsContextMixin.
+    """
+    template_name = 'perms.html'
+    permission_required = 'auth.add_user'
+    context_permissions = ('auth.add_user', 'auth.change_user',
+                           'tests.add_article')
+
+
 class SuperuserRequiredView(views.SuperuserRequiredMixin, OkView):
     pass
 
@@ -264,6 +317,14 @@ class StaffuserRequiredView(views.StaffuserRequiredMixin, OkView):
     pass
 
 
+class RateLimitedView(views.RateLimitMixin, OkView):
+    """
+    View for testing RateLimitMixin.
+    """
+    rate_limit = '2/m'
+    rate_limit_store = views.InMemoryRateLimitStore()
+
+
 class CsrfExemptView(views.CsrfExemptMixin, OkView):
     pass
 
@@ -308,6 +369,30 @@ class ModelCanonicalSlugDetailView(views.CanonicalSlugDetailMixin,
     template_name = 'blank.html'
 
 
+class CachedObjectPermissionView(views.PermissionRequiredMixin,
+                                 views.CachedObjectMixin, DetailView):
+    """
+    View for testing CachedObjectMixin with object level permissions.
+    """
+    model = Article
+    template_name = 'blank.html'
+    permission_required = 'tests.change_article'
+    object_level_permissions = True
+
+
+class ArticlePermissionsListView(views.ObjectPermissionsListMixin,
+                                 ListView):
+    """
+    View for testing ObjectPermissionsListMixin.
+    """
+    model = Article
+    ordering = 'pk'
+    paginate_by = 2
+    template_name = 'blank.html'
+    object_permission_required = 'tests.change_article'
+    object_permissions = ('tests.change_article', 'tests.delete_article')
+
+
 class FormMessagesView(views.FormMessagesMixin, CreateView):
     form_class = ArticleForm
     form_invalid_message = _('Invalid')
@@ -334,6 +419,17 @@ class UserPassesTestLoginRequiredView(views.LoginRequiredMixin,
             and user.email.endswith('@mydomain.com')
 
 
+class PolicyRequiredView(views.PolicyRequiredMixin, OkView):
+    """
+    View for testing PolicyRequiredMixin.
+    """
+    access_policy = views.Authenticated() & (
+        views.Staff() | views.InGroup('test_group')) & ~views.PassesTest()
+
+    def test_func(self, user):
+        return user.email.endswith('@banned.com')
+
+
 class UserPassesTestNotImplementedView(views.UserPassesTestMixin, OkView):
     pass
 
@@ -353,6 +449,19 @@ class RecentLoginRequiredView(views.RecentLoginRequiredMixin, OkView):
     """
 
 
+class PreDispatchRecentLoginRequiredView(views.RecentLoginRequiredMixin,
+                                         View):
+    """
+    A view for testing RecentLoginRequiredMixin's check before dispatch.
+    """
+    check_login_before_dispatch = True
+    rendered = 0
+
+    def get(self, request):
+        PreDispatchRecentLoginRequiredView.rendered += 1
+        return StreamingHttpResponse(iter(['O', 'K']))
+
+
 class AttributeHeaderView(views.HeaderMixin, OkView):
     headers = {
         'X-DJANGO-BRACES-1': 1,